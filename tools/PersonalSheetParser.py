@@ -1,60 +1,123 @@
 import pandas as pd
-import json
+import numpy as np
 from pathlib import Path
-import openpyxl
 import re
+import time
+from sheet_grid import load_sheet_grid
+from readers import WorkbookReader
+from merged_index import MergedCellIndex
+from json_stream import JsonStreamWriter, RecordCollector, TeeWriter
+from kv_shards import KvShardWriter
+from search_index import SearchIndexWriter, index_path_for
+from asset_patches import PatchWriter, log_patch
+from id_map import IdMap, SequentialIds
+from instrumentation import Metrics
+from asset_compress import print_size_report, write_compressed_companions
 
-def nameref_to_json(excel_file, output_dir=None, output_filename=None, sheet_name=None):
+# Natural key of an entry for stable ids: who calls whom, within a unit
+NAMEREF_KEY_FIELDS = ("称呼者", "被称者", "Tag_1")
+
+
+def last_index_where(flags):
+    """
+    For each position, the index of the last True flag at or before it
+    
+    Args:
+        flags (ndarray): Boolean array
+    
+    Returns:
+        ndarray: Index array, -1 where no flag has been seen yet
+    """
+    positions = np.where(flags, np.arange(len(flags)), -1)
+    return np.maximum.accumulate(positions) if len(positions) else positions
+
+def nameref_to_json(excel_file, output_dir=None, output_filename=None, sheet_name=None, start_id=676,
+                    minify=False, compress=False, shard_dir=None,
+                    search_index=False, patch_dir=None, id_map=None, key_fields=NAMEREF_KEY_FIELDS,
+                    reader="auto", write_json=True, sinks=None, metrics=None):
     """
     Convert a name reference table from Excel to JSON format using a column-by-column approach
     
     Args:
-        excel_file (str): Path to the Excel file
-        output_dir (str): Output directory, defaults to same directory as excel file
+        excel_file (str, bytes, file or WorkbookReader): Path to the Excel file, its content, or a
+            workbook that is already open
+        output_dir (str): Output directory, defaults to same directory as excel file, or the current
+            directory when it is given as content
         output_filename (str): Output filename, defaults to excel filename with .json extension
         sheet_name (str): Sheet name to process, defaults to the first sheet
+        start_id (int): ID of the first entry, defaults to 676
+        minify (bool): Write minified JSON instead of pretty-printing it with indent=2
+        compress (bool): Also write .gz and .br companions of the output file and print their sizes
+        shard_dir (str): Also write the entries as pre-chunked Deno KV values into '{shard_dir}/{output file stem}/'
+        search_index (bool): Also write a search index of the entries, '{output stem}.index.json'
+        patch_dir (str): Also compare the entries with the previous run and write the changes as a
+            versioned patch into '{patch_dir}/{output stem}/'
+        id_map (str): Id map file. When set, ids stay the same across runs for entries with the same
+            key instead of counting up from start_id in output order, see id_map.IdMap
+        key_fields (list): Fields identifying an entry in the id map, defaults to NAMEREF_KEY_FIELDS.
+            Entries sharing a key, e.g. several forms of address, are told apart by their order
+        reader (str): Workbook reader backend, "auto" (default), "calamine", "openpyxl" or "pandas".
+            Merged cells are available with every backend
+        write_json (bool): Write the JSON file. False leaves the entries to the sinks and the
+            other outputs
+        sinks (list): More StreamWriters that receive every entry,
+            e.g. a RecordCollector. The entries form one array, "人称表"
+        metrics (Metrics): Receives timers, counters and progress messages, defaults to printing them
+    
+    Returns:
+        list: Paths of the JSON files written, the output file unless write_json is False
     """
+    if metrics is None:
+        metrics = Metrics()
+    
+    # Load cell values and merged cells information in a single pass
+    with metrics.phase("load"):
+        if isinstance(excel_file, WorkbookReader):
+            grid = load_sheet_grid(excel_file, sheet_name)
+            workbook = excel_file
+        else:
+            with WorkbookReader(excel_file, reader, warn=metrics.warn) as workbook:
+                grid = load_sheet_grid(workbook, sheet_name)
+        merged_index = MergedCellIndex.from_grid(grid)
+    
     # Set up output path
     if output_dir is None:
-        output_dir = Path(excel_file).parent
+        output_dir = workbook.path.parent if workbook.path is not None else Path(".")
     else:
         output_dir = Path(output_dir)
-        output_dir.mkdir(exist_ok=True)
+        if write_json or search_index:
+            output_dir.mkdir(exist_ok=True)
     
     if output_filename is None:
-        output_filename = f"{Path(excel_file).stem}_nameref.json"
+        output_filename = f"{workbook.name}_nameref.json"
         
     output_path = output_dir / output_filename
-    
-    # First load with openpyxl to get merged cells information
-    wb = openpyxl.load_workbook(excel_file, data_only=True)
-    if sheet_name is None:
-        sheet_name = wb.sheetnames[0]
-    
-    ws = wb[sheet_name]
-    
-    # Get merged cells information
-    merged_cells = []
-    for merged_range in ws.merged_cells.ranges:
-        merged_cells.append({
-            'min_row': merged_range.min_row,
-            'max_row': merged_range.max_row,
-            'min_col': merged_range.min_col,
-            'max_col': merged_range.max_col
-        })
-    
-    # Read with pandas for easier data handling
-    df = pd.read_excel(excel_file, sheet_name=sheet_name, header=None)
+    df = grid.frame
+    classify_start = time.perf_counter()
     
     # Replace NaN with None for easier handling
     df = df.where(pd.notnull(df), None)
     
-    # Initialize variables
-    name_refs = []
-    id_counter = 676
+    # Ids count up from start_id, or come from the id map
+    stable_ids = None
+    if id_map is not None:
+        stable_ids = IdMap(id_map, key_fields, start_id=start_id)
+        ids = stable_ids.array("人称表")
+    else:
+        ids = SequentialIds(start_id)
     
     num_rows, num_cols = df.shape
     
+    # Cell values and their missing-value mask as plain arrays, indexed [row, col]
+    values = df.to_numpy(dtype=object)
+    isna = pd.isna(values)
+    first_col = values[:, 0] if num_cols else np.empty(0, dtype=object)
+    
+    # Rows where only column A has content, and rows with content outside column A
+    first_col_present = first_col != None  # noqa: E711
+    others_empty = isna[:, 1:].all(axis=1)
+    only_first_col = first_col_present & others_empty
+    
     # Identify all Tag_2 values in the first column (A)
     tag2_values = {}  # Maps row index to Tag_2 value
     callee_rows = {}  # Maps row index to callee name
@@ -62,177 +125,258 @@ def nameref_to_json(excel_file, output_dir=None, output_filename=None, sheet_nam
     current_tag2 = None
     found_first_callee = False
     
-    # First pass: Identify Tag_2 and callee values in column A
-    for row in range(1, num_rows):
-        # Check if this row in column A is a header row (only column A has content)
-        if (df.iloc[row, 0] is not None and 
-            all(pd.isna(df.iloc[row, col]) for col in range(1, num_cols))):
-            
-            if not found_first_callee:
-                # First such row is a Tag_2 value
-                current_tag2 = df.iloc[row, 0]
+    # First pass: Identify Tag_2 and callee values in column A (only rows where only column A has content)
+    for row in (np.flatnonzero(only_first_col[1:]) + 1).tolist():
+        if not found_first_callee:
+            # First such row is a Tag_2 value
+            current_tag2 = first_col[row]
+            tag2_values[row] = current_tag2
+            found_first_callee = True
+        else:
+            # Could be either a new Tag_2 or a callee name
+            # If it's all uppercase or contains a special character like /, it's likely a Tag_2
+            value = str(first_col[row])
+            if (value.isupper() or '/' in value or 
+                any(tag in value for tag in ["Leo/need", "MORE MORE JUMP", "Vivid BAD SQUAD", 
+                                            "Wonderlands×Showtime", "25时", "VIRTUAL SINGER"])):
+                current_tag2 = value
                 tag2_values[row] = current_tag2
-                found_first_callee = True
             else:
-                # Could be either a new Tag_2 or a callee name
-                # If it's all uppercase or contains a special character like /, it's likely a Tag_2
-                value = str(df.iloc[row, 0])
-                if (value.isupper() or '/' in value or 
-                    any(tag in value for tag in ["Leo/need", "MORE MORE JUMP", "Vivid BAD SQUAD", 
-                                                "Wonderlands×Showtime", "25时", "VIRTUAL SINGER"])):
-                    current_tag2 = value
-                    tag2_values[row] = current_tag2
-                else:
-                    # Otherwise it's a callee name
-                    callee_rows[row] = df.iloc[row, 0]
+                # Otherwise it's a callee name
+                callee_rows[row] = first_col[row]
+    
+    metrics.add_time("classify", time.perf_counter() - classify_start)
+    resolve_start = time.perf_counter()
     
     # Identify caller columns (columns that have a name in the first row)
     caller_cols = {}  # Maps column index to caller name
     tag1_values = {}  # Maps column index to Tag_1 value
     
-    current_tag1 = None
-    
     # Second pass: Identify Tag_1 values and caller columns
+    header_only_cols = isna[1:, :].all(axis=0)
     for col in range(1, num_cols):
         # Skip empty cells in the first row
-        if pd.isna(df.iloc[0, col]):
+        if isna[0, col]:
             continue
             
         # Check if this is a header-only column (only first row has content)
-        if all(pd.isna(df.iloc[row, col]) for row in range(1, num_rows)):
-            # If first time finding a header, it's the Tag_1
-            if current_tag1 is None:
-                current_tag1 = df.iloc[0, col]
-                tag1_values[col] = current_tag1
-            else:
-                # Update the Tag_1 value
-                current_tag1 = df.iloc[0, col]
-                tag1_values[col] = current_tag1
+        if header_only_cols[col]:
+            # Every header-only column starts a new Tag_1
+            tag1_values[col] = values[0, col]
         else:
             # This is a caller column
-            caller_cols[col] = df.iloc[0, col]
+            caller_cols[col] = values[0, col]
+    
+    metrics.add_time("resolve", time.perf_counter() - resolve_start)
+    classify_start = time.perf_counter()
+    
+    # Precompute carry-forward arrays so the extraction pass never scans the sheet again
+    is_tag2_row = np.zeros(num_rows, dtype=bool)
+    is_tag2_row[list(tag2_values)] = True
+    is_callee_row = np.zeros(num_rows, dtype=bool)
+    is_callee_row[list(callee_rows)] = True
     
-    # Process each caller column
-    for col in sorted(caller_cols.keys()):
-        caller_name = caller_cols[col]
+    # Tag_1 of each column: the closest Tag_1 column to its left
+    tag1_by_col = [None] * num_cols
+    current_tag1 = None
+    for col in range(1, num_cols):
+        current_tag1 = tag1_values.get(col, current_tag1)
+        tag1_by_col[col] = current_tag1
+    
+    # Tag_2 of each row: the closest Tag_2 row at or above it
+    last_tag2_row = last_index_where(is_tag2_row).tolist()
+    
+    # Callee of each row: column A, or else the closest row above that names a callee,
+    # either a callee header or a row with column A and other content (not a Tag_2)
+    callee_source = is_callee_row | (first_col_present & ~is_tag2_row & ~others_empty)
+    prev_callee_row = [-1] + last_index_where(callee_source)[:-1].tolist()
+    
+    callee_by_row = [None] * num_rows
+    tag2_by_row = [None] * num_rows
+    entry_rows = []
+    for row in range(1, num_rows):
+        # Skip rows that are Tag_2 or callee headers
+        if is_tag2_row[row] or is_callee_row[row]:
+            continue
         
-        # Find current Tag_1 value for this caller
-        current_tag1 = None
-        for c in range(col, 0, -1):
-            if c in tag1_values:
-                current_tag1 = tag1_values[c]
-                break
+        callee_name = first_col[row]
+        if isna[row, 0] and prev_callee_row[row] >= 0:
+            callee_name = first_col[prev_callee_row[row]]
         
-        # Process each row for this caller
-        for row in range(1, num_rows):
-            # Skip rows that are Tag_2 or callee headers
-            if row in tag2_values or row in callee_rows:
-                continue
-            
-            # Find the callee for this row by looking at column A
-            callee_name = df.iloc[row, 0]
-            if pd.isna(callee_name):
-                # If callee name is not directly in column A for this row,
-                # look upward to find the closest callee name
-                for r in range(row-1, -1, -1):
-                    if r in callee_rows:
-                        callee_name = callee_rows[r]
-                        break
-                    elif (df.iloc[r, 0] is not None and 
-                          r not in tag2_values and 
-                          not all(pd.isna(df.iloc[r, c]) for c in range(1, num_cols))):
-                        callee_name = df.iloc[r, 0]
-                        break
+        # If still no callee name, skip this row
+        if pd.isna(callee_name):
+            continue
+        
+        callee_by_row[row] = callee_name
+        if last_tag2_row[row] >= 0:
+            tag2_by_row[row] = tag2_values[last_tag2_row[row]]
+        entry_rows.append(row)
+    
+    metrics.add_time("classify", time.perf_counter() - classify_start)
+    
+    # Stream the entries to the JSON file, and optionally to KV shards, as they are produced
+    writers = []
+    if write_json:
+        writers.append(JsonStreamWriter(output_path, indent=None if minify else 2))
+    if shard_dir is not None:
+        # The migration script uses the file name as the KV key
+        shard_writer = KvShardWriter(shard_dir, kv_keys={"人称表": output_path.stem}, warn=metrics.warn)
+        writers.append(shard_writer)
+    if search_index:
+        writers.append(SearchIndexWriter(index_path_for(output_path)))
+    writers.extend(sinks or [])
+    if patch_dir is not None:
+        # Last, so the patch is only recorded once the other outputs are complete
+        patch_writer = PatchWriter(patch_dir, output_path.stem, warn=metrics.warn)
+        writers.append(patch_writer)
+    
+    # Everything in the extraction loop that is not spent in the writers is charged to "extract"
+    extract_start = time.perf_counter()
+    serialize_before = metrics.timers.get("serialize", 0.0)
+    empty_pairs = 0
+    self_references = 0
+    
+    with TeeWriter(writers, metrics) as writer:
+        writer.begin_array("人称表")
+        
+        # Process each caller column
+        for col in sorted(caller_cols.keys()):
+            caller_name = caller_cols[col]
+            current_tag1 = tag1_by_col[col]
             
-            # If still no callee name, skip this row
-            if pd.isna(callee_name):
-                continue
+            # Process each row for this caller
+            for row in entry_rows:
+                callee_name = callee_by_row[row]
+                current_tag2 = tag2_by_row[row]
                 
-            # Find current Tag_2 value for this row
-            current_tag2 = None
-            for r in range(row, -1, -1):
-                if r in tag2_values:
-                    current_tag2 = tag2_values[r]
-                    break
-            
-            # Check if this cell is part of a merged cell
-            is_merged = False
-            for mc in merged_cells:
-                if (mc['min_row'] <= row+1 <= mc['max_row'] and 
-                    mc['min_col'] <= col+1 <= mc['max_col']):
-                    is_merged = True
-                    break
-            
-            # Get the original value
-            orig_value = df.iloc[row, col]
-            
-            # Handle empty cells - if both original and translation are empty, set both to null
-            if pd.isna(orig_value):
-                # Check if both original and translation are empty
-                if col + 1 < num_cols and pd.isna(df.iloc[row, col+1]):
-                    # Create entry with null values for original and translation
+                # Check if this cell is part of a merged cell
+                is_merged = merged_index.is_merged(row, col)
+                
+                # Get the original value
+                orig_value = values[row, col]
+                
+                # Handle empty cells - if both original and translation are empty, set both to null
+                if isna[row, col]:
+                    # Check if both original and translation are empty
+                    if col + 1 < num_cols and isna[row, col+1]:
+                        # Create entry with null values for original and translation
+                        name_ref = {
+                            "称呼者": caller_name,
+                            "被称者": callee_name,
+                            "原文": None,
+                            "译文": None,
+                            "id": None
+                        }
+                        if current_tag1 is not None:
+                            name_ref["Tag_1"] = current_tag1
+                        if current_tag2 is not None:
+                            name_ref["Tag_2"] = current_tag2
+                        name_ref["id"] = ids.assign(name_ref)
+                        writer.write_item(name_ref)
+                        empty_pairs += 1
+                    continue
+                
+                # Check next column for translation
+                if col + 1 < num_cols and not isna[row, col+1]:
+                    # Regular name reference with translation in next column
+                    trans_value = values[row, col+1]
+                    
                     name_ref = {
                         "称呼者": caller_name,
                         "被称者": callee_name,
-                        "原文": None,
-                        "译文": None,
-                        "id": id_counter
+                        "原文": orig_value,
+                        "译文": trans_value,
+                        "id": None
                     }
                     if current_tag1 is not None:
                         name_ref["Tag_1"] = current_tag1
-                    if current_tag2 is not None:
+                    if current_tag2 is not None and current_tag2 != current_tag1:
                         name_ref["Tag_2"] = current_tag2
-                    name_refs.append(name_ref)
-                    id_counter += 1
-                continue
-            
-            # Check next column for translation
-            if col + 1 < num_cols and not pd.isna(df.iloc[row, col+1]):
-                # Regular name reference with translation in next column
-                trans_value = df.iloc[row, col+1]
-                
-                name_ref = {
-                    "称呼者": caller_name,
-                    "被称者": callee_name,
-                    "原文": orig_value,
-                    "译文": trans_value,
-                    "id": id_counter
-                }
-                if current_tag1 is not None:
-                    name_ref["Tag_1"] = current_tag1
-                if current_tag2 is not None and current_tag2 != current_tag1:
-                    name_ref["Tag_2"] = current_tag2
-                name_refs.append(name_ref)
-                id_counter += 1
-            elif is_merged:
-                # Self-reference (merged cell)
-                name_ref = {
-                    "称呼者": caller_name,
-                    "被称者": callee_name,
-                    "原文": orig_value,
-                    "译文": orig_value,  # Same as original for self-references
-                    "id": id_counter
-                }
-                if current_tag1 is not None:
-                    name_ref["Tag_1"] = current_tag1
-                if current_tag2 is not None and current_tag2 != current_tag1:
-                    name_ref["Tag_2"] = current_tag2
-                name_refs.append(name_ref)
-                id_counter += 1
-    
-    # Create the final JSON structure
-    json_data = {
-        "人称表": name_refs
-    }
-    
-    # Write the JSON file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
-    
-    print(f"Converted name reference table to JSON. Saved to {output_path}")
-    print(f"Generated {len(name_refs)} name reference entries.")
-    print(f"Found {len(tag1_values)} Tag_1 values and {len(tag2_values)} Tag_2 values")
-    print(f"Found {len(caller_cols)} caller columns")
+                    name_ref["id"] = ids.assign(name_ref)
+                    writer.write_item(name_ref)
+                elif is_merged:
+                    # Self-reference (merged cell)
+                    name_ref = {
+                        "称呼者": caller_name,
+                        "被称者": callee_name,
+                        "原文": orig_value,
+                        "译文": orig_value,  # Same as original for self-references
+                        "id": None
+                    }
+                    if current_tag1 is not None:
+                        name_ref["Tag_1"] = current_tag1
+                    if current_tag2 is not None and current_tag2 != current_tag1:
+                        name_ref["Tag_2"] = current_tag2
+                    name_ref["id"] = ids.assign(name_ref)
+                    writer.write_item(name_ref)
+                    self_references += 1
+    
+    # Lets the migration tell the shards are cut from the current asset file
+    if shard_dir is not None and write_json:
+        shard_writer.record_source(output_path)
+    
+    # Only record the allocated ids once the output is complete
+    if stable_ids is not None:
+        stable_ids.save()
+    
+    serialized = metrics.timers.get("serialize", 0.0) - serialize_before
+    metrics.add_time("extract", time.perf_counter() - extract_start - serialized)
+    
+    metrics.count("records", writer.items)
+    metrics.count("empty_pairs", empty_pairs)
+    metrics.count("self_references", self_references)
+    metrics.count("tag1_values", len(tag1_values))
+    metrics.count("tag2_values", len(tag2_values))
+    metrics.count("callee_rows", len(callee_rows))
+    metrics.count("caller_columns", len(caller_cols))
+    
+    if write_json:
+        metrics.log(f"Converted name reference table to JSON. Saved to {output_path}")
+    metrics.log(f"Generated {writer.items} name reference entries.")
+    metrics.log(f"Found {len(tag1_values)} Tag_1 values and {len(tag2_values)} Tag_2 values")
+    metrics.log(f"Found {len(caller_cols)} caller columns")
+    if shard_dir is not None:
+        metrics.log(f"Wrote KV shards to {shard_writer.written[0]}")
+    if search_index:
+        metrics.log(f"Wrote search index to {index_path_for(output_path)}")
+    if stable_ids is not None:
+        metrics.count("duplicate_keys", ids.duplicates)
+        metrics.log(f"Saved id map to {id_map} ({ids.added} new ids)")
+    if patch_dir is not None:
+        log_patch(patch_writer, metrics)
+    
+    if compress:
+        with metrics.phase("serialize"):
+            if write_json:
+                write_compressed_companions(output_path, metrics.warn)
+            if search_index:
+                write_compressed_companions(index_path_for(output_path), metrics.warn)
+    if (minify or compress) and write_json and not metrics.quiet:
+        print_size_report([output_path])
+    
+    workbook_name = str(workbook.excel_file) if workbook.path is not None else workbook.name
+    metrics.report("nameref_to_json", excel_file=workbook_name, sheet=grid.title)
+    return [output_path] if write_json else []
+
+
+def nameref_records(excel_file, sheet_name=None, **options):
+    """
+    Convert a name reference table and return its entries instead of writing them to a file
+    
+    Takes the arguments of nameref_to_json. Other outputs such as shard_dir or search_index are
+    still written, from the same pass over the sheet.
+    
+    Args:
+        excel_file (str, bytes, file or WorkbookReader): Path to the Excel file, its content, or an open workbook
+        sheet_name (str): Sheet name to process, defaults to the first sheet
+    
+    Returns:
+        list: The name reference entries, in output order
+    """
+    collector = RecordCollector()
+    sinks = [collector] + list(options.pop("sinks", None) or [])
+    nameref_to_json(excel_file, sheet_name=sheet_name, write_json=False, sinks=sinks, **options)
+    return collector.data.get("人称表", [])
 
 def main():
     excel_file = r"./PJS翻译资料.xlsx"  # Replace with your actual Excel file path
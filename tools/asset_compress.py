@@ -0,0 +1,81 @@
+import gzip
+from pathlib import Path
+
+from json_stream import write_atomic
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Suffixes of the pre-compressed files written next to an asset
+COMPANION_SUFFIXES = (".gz", ".br")
+
+
+def companion_paths(path):
+    """Paths of the pre-compressed companions of an asset"""
+    path = Path(path)
+    return [path.with_name(path.name + suffix) for suffix in COMPANION_SUFFIXES]
+
+
+def write_compressed_companions(path, warn=print):
+    """
+    Write '{path}.gz' and '{path}.br' next to an asset
+
+    The gzip file has no timestamp, so unchanged assets produce identical companions. The .br
+    file needs the optional brotli package and is skipped with a warning when it is missing.
+
+    Args:
+        path (str): Asset file path
+        warn (callable): Called with a message when brotli is missing, e.g. Metrics.warn
+
+    Returns:
+        list: Paths of the companions that were written
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    gz_path, br_path = companion_paths(path)
+
+    write_atomic(gz_path, gzip.compress(data, compresslevel=9, mtime=0))
+    written = [gz_path]
+
+    if brotli is not None:
+        write_atomic(br_path, brotli.compress(data, quality=11))
+        written.append(br_path)
+    else:
+        warn(f"Warning: brotli is not installed, skipping {br_path.name}")
+
+    return written
+
+
+def asset_sizes(path):
+    """
+    Size in bytes of an asset and of its compressed companions
+
+    Returns:
+        dict: "json", "gz" and "br" sizes, None for files that do not exist
+    """
+    path = Path(path)
+    gz_path, br_path = companion_paths(path)
+    return {
+        "json": path.stat().st_size if path.exists() else None,
+        "gz": gz_path.stat().st_size if gz_path.exists() else None,
+        "br": br_path.stat().st_size if br_path.exists() else None,
+    }
+
+
+def print_size_report(paths):
+    """Print the payload size of each asset and its compressed companions"""
+    print("Asset sizes:")
+    for path in paths:
+        sizes = asset_sizes(path)
+        if sizes["json"] is None:
+            print(f"  {Path(path).name}: missing")
+            continue
+
+        line = f"  {Path(path).name}: {sizes['json']:,} B"
+        for label, key in (("gzip", "gz"), ("brotli", "br")):
+            if sizes[key] is not None:
+                ratio = sizes[key] / sizes["json"] * 100 if sizes["json"] else 0
+                line += f", {label} {sizes[key]:,} B ({ratio:.1f}%)"
+        print(line)
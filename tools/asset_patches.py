@@ -0,0 +1,245 @@
+import hashlib
+import json
+from pathlib import Path
+
+from json_stream import StreamWriter, compact_json, write_atomic
+
+# Patches kept per asset, clients further behind than the oldest one reload the whole asset
+MAX_PATCHES = 50
+
+# Bytes of a record hash
+HASH_SIZE = 8
+
+
+def record_hash(record):
+    """Short content hash of a record, key order included since it shows in the output"""
+    return hashlib.blake2b(compact_json(record).encode('utf-8'), digest_size=HASH_SIZE).digest()
+
+
+class PatchWriter(StreamWriter):
+    """
+    Compare converter output with the previous version and write the changes as a patch
+
+    Records are matched by id and compared by content hash. Every run that changes the asset
+    bumps its version and writes '{patch_dir}/{name}/':
+        patch_000005.json  changes from version 4 to 5, per array: "added" and "modified" records,
+                           "removed" ids and, when the order changed, the new "order" of ids
+        manifest.json      current version and the patches that are kept
+        state.json         ids and hashes of the current version, the base of the next diff
+
+    The first run only records version 1. Only the changed records are held in memory, the ids
+    and hashes of both versions are kept as columns: a list of ids and the hashes packed into
+    one bytes object, 8 bytes per record.
+
+    Args:
+        patch_dir (str): Directory that receives one sub-directory per asset
+        name (str): Asset name, usually the output file stem
+        id_field (str): Field identifying a record across versions
+        max_patches (int): Number of patches to keep
+        warn (callable): Called with a message when ids are repeated, e.g. Metrics.warn
+    """
+
+    def __init__(self, patch_dir, name, id_field="id", max_patches=MAX_PATCHES, warn=print):
+        self.path = Path(patch_dir) / name
+        self.name = name
+        self.id_field = id_field
+        self.max_patches = max_patches
+        self.warn = warn
+        self.arrays = 0
+        self.items = 0
+        self.base_version = None  # Version of the previous run, None on the first run
+        self.version = None  # Version after close()
+        self.written = None  # Path of the patch written by close(), if any
+        self._previous = None
+        self._arrays = {}
+        self._current = None
+
+    def open(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        state_path = self.path / "state.json"
+        if state_path.exists():
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self._previous = json.load(f)
+            self.base_version = self._previous["version"]
+        self._arrays = {}
+
+    def begin_array(self, key):
+        """Start comparing a top-level array with its previous version"""
+        self.end_array()
+
+        previous_ids, previous_hashes = [], b""
+        if self._previous is not None and key in self._previous["arrays"]:
+            previous = self._previous["arrays"][key]
+            previous_ids, previous_hashes = previous["ids"], bytes.fromhex(previous["hashes"])
+        self._current = {
+            "key": key,
+            "previous_ids": previous_ids,
+            "previous_hashes": previous_hashes,
+            # Position of each previous id, the last one wins if an id is repeated
+            "positions": {record_id: i for i, record_id in enumerate(previous_ids)},
+            "ids": [],
+            "hashes": bytearray(),
+            "added": [],
+            "modified": [],
+        }
+        self.arrays += 1
+        self.items = 0
+
+    def write_item(self, item):
+        """Compare one record with the previous version"""
+        current = self._current
+        if current is None:
+            raise RuntimeError("write_item() called before begin_array()")
+
+        record_id = item.get(self.id_field)
+        item_hash = record_hash(item)
+        current["ids"].append(record_id)
+        current["hashes"] += item_hash
+
+        position = current["positions"].get(record_id)
+        if position is None:
+            # The first run writes no patch, so there is nothing to keep the record for
+            if self._previous is not None:
+                current["added"].append(item)
+        elif current["previous_hashes"][position * HASH_SIZE:(position + 1) * HASH_SIZE] != item_hash:
+            current["modified"].append(item)
+        self.items += 1
+
+    def end_array(self):
+        """Work out the removed ids and whether the order changed"""
+        current = self._current
+        if current is None:
+            return
+
+        order = current["ids"]
+        if len(set(order)) != len(order):
+            self.warn(f"Warning: '{current['key']}' has duplicate values in '{self.id_field}', patches may not apply cleanly")
+
+        kept = set(order)
+        removed = [record_id for record_id in current["previous_ids"] if record_id not in kept]
+
+        # Applying a patch removes, replaces in place and appends the added records at the end
+        gone = set(removed)
+        added = [item.get(self.id_field) for item in current["added"]]
+        expected = [record_id for record_id in current["previous_ids"] if record_id not in gone] + added
+
+        changes = {}
+        if current["added"]:
+            changes["added"] = current["added"]
+        if current["modified"]:
+            changes["modified"] = current["modified"]
+        if removed:
+            changes["removed"] = removed
+        if order != expected:
+            changes["order"] = order
+
+        self._arrays[current["key"]] = (order, bytes(current["hashes"]), changes)
+        self._current = None
+
+    def close(self):
+        """Write the patch, manifest and state if anything changed since the previous version"""
+        self.end_array()
+
+        if self._previous is None:
+            self.version = 1
+            manifest = {"key": self.name, "version": self.version, "idField": self.id_field, "patches": []}
+        else:
+            arrays = {key: changes for key, (_, _, changes) in self._arrays.items() if changes}
+            removed_arrays = [key for key in self._previous["arrays"] if key not in self._arrays]
+            previous_version = self._previous["version"]
+            if not arrays and not removed_arrays and list(self._previous["arrays"]) == list(self._arrays):
+                self.version = previous_version
+                return
+
+            self.version = previous_version + 1
+            patch = {"key": self.name, "version": self.version, "baseVersion": previous_version, "arrays": arrays}
+            if removed_arrays:
+                patch["removedArrays"] = removed_arrays
+            if list(self._previous["arrays"]) != list(self._arrays):
+                patch["arrayOrder"] = list(self._arrays)
+
+            self.written = self.path / f"patch_{self.version:06d}.json"
+            write_atomic(self.written, compact_json(patch))
+
+            manifest = read_patch_manifest(self.path)
+            manifest["version"] = self.version
+            manifest["idField"] = self.id_field
+            manifest["patches"].append({
+                "file": self.written.name,
+                "version": self.version,
+                "baseVersion": previous_version,
+                "bytes": self.written.stat().st_size,
+                "added": sum(len(changes.get("added", [])) for changes in arrays.values()),
+                "modified": sum(len(changes.get("modified", [])) for changes in arrays.values()),
+                "removed": sum(len(changes.get("removed", [])) for changes in arrays.values()),
+            })
+
+            # Drop the oldest patches
+            for old in manifest["patches"][:-self.max_patches]:
+                (self.path / old["file"]).unlink(missing_ok=True)
+            manifest["patches"] = manifest["patches"][-self.max_patches:]
+
+        # The state goes last, a run that fails before it is diffed again next time
+        state = {
+            "version": self.version,
+            "idField": self.id_field,
+            "arrays": {key: {"ids": ids, "hashes": hashes.hex()} for key, (ids, hashes, _) in self._arrays.items()},
+        }
+        write_atomic(self.path / "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        write_atomic(self.path / "state.json", compact_json(state))
+
+    def abort(self):
+        """Discard the comparison, the previous version stays current"""
+        self._current = None
+        self._arrays = {}
+
+
+def log_patch(patch_writer, metrics):
+    """Report the outcome of a closed PatchWriter through a Metrics instance"""
+    if patch_writer.written is not None:
+        metrics.log(f"Wrote patch to version {patch_writer.version}: {patch_writer.written}")
+    elif patch_writer.base_version is None:
+        metrics.log(f"Recorded version 1 of '{patch_writer.name}' as the base for patches")
+    else:
+        metrics.log(f"No changes since version {patch_writer.version} of '{patch_writer.name}'")
+    metrics.count("patch_version", patch_writer.version)
+
+
+def read_patch_manifest(patch_path):
+    """Read 'manifest.json' of an asset's patches written by PatchWriter"""
+    with open(Path(patch_path) / "manifest.json", 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def apply_patch(data, patch, id_field="id"):
+    """
+    Apply a patch to the previous version of an asset, the reference for clients applying deltas
+
+    Args:
+        data (dict): Asset of version patch["baseVersion"], maps array keys to record lists
+        patch (dict): Patch written by PatchWriter
+
+    Returns:
+        dict: The asset at version patch["version"]
+    """
+    result = {}
+    removed_arrays = set(patch.get("removedArrays", []))
+    for key, records in data.items():
+        if key not in removed_arrays:
+            result[key] = list(records)
+
+    for key, changes in patch["arrays"].items():
+        records = result.setdefault(key, [])
+        removed = set(changes.get("removed", []))
+        modified = {record[id_field]: record for record in changes.get("modified", [])}
+        records = [modified.get(record[id_field], record) for record in records if record[id_field] not in removed]
+        records += changes.get("added", [])
+
+        if "order" in changes:
+            by_id = {record[id_field]: record for record in records}
+            records = [by_id[record_id] for record_id in changes["order"]]
+        result[key] = records
+
+    if "arrayOrder" in patch:
+        result = {key: result[key] for key in patch["arrayOrder"]}
+    return result
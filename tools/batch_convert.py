@@ -0,0 +1,373 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from xls2json import excel_to_json
+from PersonalSheetParser import nameref_to_json
+from build_cache import BuildCache, job_fingerprint, restore_outputs, sheet_fingerprints, tools_hash
+from asset_compress import companion_paths, print_size_report
+from kv_shards import read_shard_manifest
+from search_index import index_path_for
+from id_map import id_map_path_for
+from instrumentation import JsonLinesSink, Metrics
+from readers import READERS
+
+DEFAULT_MANIFEST = Path(__file__).parent / "assets_manifest.json"
+
+PARSERS = ("table", "nameref")
+
+
+def load_manifest(manifest_path, only=None):
+    """
+    Read the asset manifest and turn it into a list of conversion jobs
+
+    The manifest maps each output asset name to the sheet it is generated from. Top-level
+    "workbook", "output_dir", "minify", "compress", "shard_dir", "search_index", "patch_dir", "id_map_dir"
+    and "reader" are defaults
+    that each asset can override. Relative paths are resolved against the manifest's directory.
+
+    Args:
+        manifest_path (str): Path to the manifest JSON file
+        only (list): Asset names to keep, defaults to all assets
+
+    Returns:
+        list: Job dictionaries with name, parser, workbook, output_dir, sheet and converter options
+    """
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    base_dir = manifest_path.parent
+    assets = manifest.get("assets", {})
+
+    if only:
+        missing = [name for name in only if name not in assets]
+        if missing:
+            raise ValueError(f"Assets not in manifest: {', '.join(missing)}")
+        assets = {name: assets[name] for name in only}
+
+    jobs = []
+    for name, asset in assets.items():
+        job = dict(asset)
+        job["name"] = name
+        job["workbook"] = str(base_dir / asset.get("workbook", manifest.get("workbook")))
+        job["output_dir"] = str(base_dir / asset.get("output_dir", manifest.get("output_dir", "output")))
+        job["minify"] = asset.get("minify", manifest.get("minify", False))
+        job["compress"] = asset.get("compress", manifest.get("compress", False))
+        shard_dir = asset.get("shard_dir", manifest.get("shard_dir"))
+        job["shard_dir"] = str(base_dir / shard_dir) if shard_dir else None
+        job["search_index"] = asset.get("search_index", manifest.get("search_index", False))
+        patch_dir = asset.get("patch_dir", manifest.get("patch_dir"))
+        job["patch_dir"] = str(base_dir / patch_dir) if patch_dir else None
+        id_map_dir = asset.get("id_map_dir", manifest.get("id_map_dir"))
+        job["id_map_dir"] = str(base_dir / id_map_dir) if id_map_dir else None
+        job["reader"] = asset.get("reader", manifest.get("reader", "auto"))
+
+        if job.get("parser") not in PARSERS:
+            raise ValueError(f"Asset '{name}' has unknown parser '{job.get('parser')}', expected one of: {', '.join(PARSERS)}")
+        if job["reader"] not in READERS:
+            raise ValueError(f"Asset '{name}' has unknown reader '{job['reader']}', expected one of: {', '.join(READERS)}")
+        if not job.get("sheet"):
+            raise ValueError(f"Asset '{name}' does not specify a sheet")
+        if job["id_map_dir"] and job["parser"] == "table" and not job.get("key_fields"):
+            raise ValueError(f"Asset '{name}' needs \"key_fields\" for stable ids, e.g. [\"原名\", \"Tag_0\"]")
+        jobs.append(job)
+
+    return jobs
+
+
+def output_path_for(job):
+    return Path(job["output_dir"]) / f"{job['name']}.json"
+
+
+def shard_path_for(job):
+    """Directory of the asset's KV shards, or None when the job does not write shards"""
+    if not job.get("shard_dir"):
+        return None
+    return Path(job["shard_dir"]) / job["name"]
+
+
+def output_files_for(job):
+    """
+    The asset file plus its search index, compressed companions and KV shards, when the job writes them
+
+    Patches and id maps are left out on purpose: restoring an older state would rewind the asset's
+    version or forget ids. A cache hit means the asset is unchanged since its last conversion, so
+    they are current.
+    """
+    output_path = output_path_for(job)
+    files = [output_path]
+    if job.get("search_index"):
+        files.append(index_path_for(output_path))
+    if job.get("compress"):
+        files += [path for file in list(files) for path in companion_paths(file) if path.exists()]
+
+    shard_path = shard_path_for(job)
+    if shard_path is not None:
+        manifest = read_shard_manifest(shard_path)
+        files.append(shard_path / "manifest.json")
+        files += [shard_path / chunk["file"] for chunk in manifest["chunks"]]
+    return files
+
+
+def convert_asset(job, metrics=None, workbook=None):
+    """
+    Run the converter for one manifest job, writing '{name}.json' into its output directory
+
+    Args:
+        job (dict): Job from load_manifest
+        metrics (Metrics): Receives the converter's timers, counters and messages
+        workbook (WorkbookReader): The job's workbook if it is already open, e.g. to share it between jobs
+
+    Raises:
+        RuntimeError: The converter did not write the asset file, e.g. because the sheet is missing
+    """
+    name = job["name"]
+    output_path = output_path_for(job)
+    output_filename = output_path.name
+
+    # Stable ids, keyed by the asset's "key_fields" or, for nameref, the converter's default key
+    id_options = {}
+    if job.get("id_map_dir"):
+        id_options["id_map"] = id_map_path_for(job["id_map_dir"], name)
+        if job.get("key_fields") is not None:
+            id_options["key_fields"] = job["key_fields"]
+
+    if job["parser"] == "table":
+        written = excel_to_json(
+            workbook or job["workbook"],
+            job["output_dir"],
+            sheets=[job["sheet"]],
+            header_row=job.get("header_row", 0),
+            id_field=job.get("id_field", "id"),
+            columns=job.get("columns"),
+            consolidated=True,
+            tag_column=job.get("tag_column"),
+            output_filename=output_filename,
+            sheet_keys={job["sheet"]: name},
+            start_id=job.get("start_id", 0),
+            minify=job["minify"],
+            compress=job["compress"],
+            shard_dir=job.get("shard_dir"),
+            search_index=job["search_index"],
+            patch_dir=job.get("patch_dir"),
+            reader=job["reader"],
+            metrics=metrics,
+            **id_options
+        )
+    else:
+        written = nameref_to_json(workbook or job["workbook"], job["output_dir"], output_filename, job["sheet"],
+                        start_id=job.get("start_id", 676), minify=job["minify"], compress=job["compress"],
+                        shard_dir=job.get("shard_dir"), search_index=job["search_index"],
+                        patch_dir=job.get("patch_dir"), reader=job["reader"], metrics=metrics, **id_options)
+
+    # The converters only warn when the sheet is missing
+    if output_path not in written:
+        raise RuntimeError(f"No output written to {output_path}")
+    return output_path
+
+
+def compute_fingerprints(jobs):
+    """
+    Fingerprint every job's sheet, reading each workbook once
+
+    Returns:
+        dict: Maps asset name to its fingerprint, or None if it could not be computed
+    """
+    code_hash = tools_hash()
+    sheets_by_workbook = {}
+    for job in jobs:
+        sheets_by_workbook.setdefault(job["workbook"], []).append(job["sheet"])
+
+    sheet_hashes = {}
+    for workbook, sheet_names in sheets_by_workbook.items():
+        try:
+            sheet_hashes[workbook] = sheet_fingerprints(workbook, sheet_names)
+        except Exception as e:
+            print(f"Warning: Could not fingerprint {workbook}: {type(e).__name__}: {e}")
+            sheet_hashes[workbook] = {}
+
+    return {job["name"]: job_fingerprint(job, sheet_hashes[job["workbook"]].get(job["sheet"]), code_hash)
+            for job in jobs}
+
+
+def run_job(job, quiet=False):
+    """
+    Convert one asset, catching any error so a failing sheet does not affect the others
+
+    Returns:
+        tuple: (asset name, elapsed seconds, error message or None, metrics dict)
+    """
+    metrics = Metrics(quiet=quiet)
+    start = time.perf_counter()
+    try:
+        convert_asset(job, metrics)
+    except Exception as e:
+        return job["name"], time.perf_counter() - start, f"{type(e).__name__}: {e}", metrics.as_dict()
+
+    return job["name"], time.perf_counter() - start, None, metrics.as_dict()
+
+
+def run_batch(jobs, max_workers=None, cache=None, quiet=False, sink=None):
+    """
+    Run conversion jobs in parallel across a process pool
+
+    Args:
+        jobs (list): Jobs from load_manifest
+        max_workers (int): Number of worker processes, defaults to the CPU count
+        cache (BuildCache): Build cache used to skip unchanged sheets, or None to convert everything
+        quiet (bool): Only print the converters' warnings, not their progress messages
+        sink (JsonLinesSink): Receives one "asset" record per job with its status, timers and counters
+
+    Returns:
+        dict: Maps asset name to (elapsed seconds, error message or None, status), in manifest order.
+            Status is "converted", "cached" or "failed"
+    """
+    results = {}
+    pending = jobs
+    fingerprints = {}
+
+    if cache is not None:
+        # Restore unchanged assets from the cache instead of converting them
+        fingerprints = compute_fingerprints(jobs)
+        pending = []
+        for job in jobs:
+            cached_files = cache.lookup(job["name"], fingerprints[job["name"]])
+            if cached_files is None:
+                pending.append(job)
+                continue
+            start = time.perf_counter()
+            restore_outputs(cached_files)
+            results[job["name"]] = (time.perf_counter() - start, None, "cached")
+            if sink is not None:
+                sink.write({"time": time.time(), "event": "asset", "name": job["name"], "status": "cached",
+                            "elapsed": results[job["name"]][0]})
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_job, job, quiet): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    _, elapsed, error, job_metrics = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    elapsed, error, job_metrics = 0.0, f"{type(e).__name__}: {e}", {}
+
+                if cache is not None:
+                    if error is None:
+                        cache.store(job, fingerprints.get(job["name"]), output_files_for(job))
+                    else:
+                        cache.remove(job["name"])
+
+                results[job["name"]] = (elapsed, error, "converted" if error is None else "failed")
+                if sink is not None:
+                    sink.write({"time": time.time(), "event": "asset", "name": job["name"],
+                                "status": results[job["name"]][2], "elapsed": elapsed, "error": error, **job_metrics})
+
+    if cache is not None:
+        cache.save()
+
+    return {job["name"]: results[job["name"]] for job in jobs}
+
+
+def apply_output_overrides(jobs, args):
+    """
+    Apply the --output-dir, --minify, --pretty, --compress, --shards, --search-index, --patches, --id-maps
+    and --reader flags
+    """
+    for job in jobs:
+        if args.output_dir:
+            job["output_dir"] = args.output_dir
+        if args.minify or args.pretty:
+            job["minify"] = args.minify and not args.pretty
+        if args.compress:
+            job["compress"] = True
+        if args.shards:
+            job["shard_dir"] = args.shards
+        if args.search_index:
+            job["search_index"] = True
+        if args.patches:
+            job["patch_dir"] = args.patches
+        if args.id_maps:
+            job["id_map_dir"] = args.id_maps
+        if args.reader:
+            job["reader"] = args.reader
+    return jobs
+
+
+def add_output_arguments(parser):
+    """Command line flags that override the output options of every job, see apply_output_overrides"""
+    parser.add_argument("-o", "--output-dir", metavar="DIR", default=None,
+                        help="Write every asset into DIR instead of the manifest's output_dir, "
+                             "e.g. ../public/assets once the output has been checked against the published assets")
+    parser.add_argument("--minify", action="store_true", help="Write minified JSON for every asset")
+    parser.add_argument("--pretty", action="store_true", help="Write pretty-printed JSON for every asset (for diffs)")
+    parser.add_argument("--compress", action="store_true", help="Also write .gz and .br companions for every asset")
+    parser.add_argument("--shards", metavar="DIR", default=None,
+                        help="Also write pre-chunked Deno KV shards for every asset into DIR")
+    parser.add_argument("--search-index", action="store_true", help="Also write a search index next to every asset")
+    parser.add_argument("--patches", metavar="DIR", default=None,
+                        help="Also diff every asset against its previous run and write versioned patches into DIR")
+    parser.add_argument("--id-maps", metavar="DIR", default=None,
+                        help="Keep ids stable across runs with one id map per asset in DIR")
+    parser.add_argument("--reader", choices=READERS, default=None,
+                        help="Workbook reader backend for every asset, falls back when it is not installed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert all assets listed in the manifest in parallel")
+    parser.add_argument("assets", nargs="*", help="Asset names to convert, defaults to all assets")
+    parser.add_argument("-m", "--manifest", default=str(DEFAULT_MANIFEST), help="Path to the asset manifest")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    add_output_arguments(parser)
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print warnings and the summary")
+    parser.add_argument("--metrics", metavar="FILE", default=None,
+                        help="Append per-asset timers and counters to FILE as JSON lines")
+    parser.add_argument("--no-cache", action="store_true", help="Convert every asset, ignoring the build cache")
+    parser.add_argument("--cache-dir", default=None, help="Build cache directory, defaults to tools/.build_cache")
+    args = parser.parse_args(argv)
+
+    jobs = apply_output_overrides(load_manifest(args.manifest, args.assets), args)
+    print(f"Converting {len(jobs)} assets: {', '.join(job['name'] for job in jobs)}")
+
+    start = time.perf_counter()
+    cache = None
+    if not args.no_cache:
+        cache = BuildCache(args.cache_dir)
+        # Evict against the whole manifest, not just the selected assets
+        evicted = cache.evict_stale(apply_output_overrides(load_manifest(args.manifest), args))
+        if evicted:
+            print(f"Evicted cache entries for changed assets: {', '.join(evicted)}")
+
+    sink = JsonLinesSink(args.metrics) if args.metrics else None
+    try:
+        results = run_batch(jobs, args.jobs, cache, args.quiet, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+    total = time.perf_counter() - start
+
+    failed = 0
+    print("\nSummary:")
+    for name, (elapsed, error, status) in results.items():
+        if status == "cached":
+            print(f"  CACHED  {name} ({elapsed:.2f}s)")
+        elif error is None:
+            print(f"  OK      {name} ({elapsed:.2f}s)")
+        else:
+            failed += 1
+            print(f"  FAILED  {name} ({elapsed:.2f}s): {error}")
+
+    print(f"Converted {len(results) - failed}/{len(results)} assets in {total:.2f}s")
+
+    print()
+    print_size_report([output_path_for(job) for job in jobs if results[job["name"]][1] is None])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
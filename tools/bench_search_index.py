@@ -0,0 +1,114 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from search_index import SearchIndex, SearchIndexWriter, index_path_for
+
+
+def load_records(asset_path, key=None):
+    """Records of one array of a converted asset"""
+    with open(asset_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if key is None:
+        key = next(iter(data))
+    return key, data[key]
+
+
+def sample_queries(records, fields, count, seed=0):
+    """Substrings of 1-4 characters cut from random field values"""
+    rng = random.Random(seed)
+    values = [str(record[field]) for record in records for field in fields
+              if record.get(field) is not None and record[field] == record[field] and str(record[field]).strip()]
+    if not values:
+        return []
+
+    queries = []
+    for _ in range(count):
+        value = rng.choice(values)
+        length = min(len(value), rng.randint(1, 4))
+        start = rng.randint(0, len(value) - length)
+        queries.append(value[start:start + length])
+    return queries
+
+
+def linear_scan(records, fields, query):
+    """The frontend's current search, a case-insensitive substring scan of every record"""
+    query = query.lower()
+    return [record["id"] for record in records
+            if any(record.get(field) is not None and query in str(record[field]).lower() for field in fields)]
+
+
+def normalized_scan(index, records, query):
+    """Linear scan with the index normalization, the reference result for the index"""
+    return [record["id"] for record in records if index.matches(record, query)]
+
+
+def time_queries(search, queries):
+    """Run each query once and return the latencies in milliseconds"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def print_latencies(label, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"  {label:<16} mean {statistics.mean(ordered):8.3f} ms  p50 {statistics.median(ordered):8.3f} ms  "
+          f"p95 {p95:8.3f} ms  max {ordered[-1]:8.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure search index query latency against a linear scan")
+    parser.add_argument("asset", help="Converted asset JSON file")
+    parser.add_argument("--index", default=None, help="Index file, built in memory when it does not exist")
+    parser.add_argument("--key", default=None, help="Array key to search, defaults to the first one")
+    parser.add_argument("-n", "--queries", type=int, default=1000, help="Number of sampled queries")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the query sample")
+    args = parser.parse_args(argv)
+
+    key, records = load_records(args.asset, args.key)
+    index_path = Path(args.index) if args.index else index_path_for(args.asset)
+
+    if index_path.exists():
+        index = SearchIndex.load(index_path, key)
+        print(f"Loaded index {index_path} ({index_path.stat().st_size:,} B)")
+    else:
+        start = time.perf_counter()
+        writer = SearchIndexWriter(index_path)
+        writer.begin_array(key)
+        for record in records:
+            writer.write_item(record)
+        index_data = writer.to_dict()
+        build_time = time.perf_counter() - start
+        size = len(json.dumps(index_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        index = SearchIndex(index_data, key)
+        print(f"Built index in {build_time:.2f}s ({size:,} B minified)")
+
+    print(f"{len(records)} records, indexed fields: {', '.join(index.fields)}")
+    records_by_id = {record["id"]: record for record in records}
+    queries = sample_queries(records, index.fields, args.queries, args.seed)
+    if not queries:
+        print("No field values to sample queries from")
+        return 1
+
+    # The index with candidate verification must agree with the normalized scan
+    mismatches = [query for query in queries
+                  if not set(normalized_scan(index, records, query)) <= set(index.search(query, records_by_id))]
+    print(f"{len(queries)} queries, {len(mismatches)} with missing results")
+
+    print("Latency:")
+    print_latencies("linear scan", time_queries(lambda q: linear_scan(records, index.fields, q), queries))
+    print_latencies("normalized scan", time_queries(lambda q: normalized_scan(index, records, q), queries))
+    print_latencies("index", time_queries(lambda q: index.search(q, records_by_id), queries))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is reported as null there
+    resource = None
+
+from readers import READERS, resolve_reader
+from synth_workbook import NAMEREF_SHEET, TERM_SHEET, generate_workbook, term_sheet_names
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# "sheets" converts a workbook of several 专有名词 sheets in one excel_to_json call, serially and
+# with a worker per sheet, to measure the parallel speedup. It is only run when asked for
+CONVERTERS = ("table", "nameref", "sheets")
+DEFAULT_CONVERTERS = ("table", "nameref")
+DEFAULT_SHEETS = 4
+
+# Relative slowdown of a phase or total that counts as a regression against the baseline
+DEFAULT_THRESHOLD = 0.10
+
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MiB, or None if it cannot be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def workbook_for(converter, rows, work_dir, callers, seed, sheets=DEFAULT_SHEETS):
+    """Generate the synthetic workbook for a case, reusing it if it already exists"""
+    if converter == "sheets":
+        path = Path(work_dir) / f"synth_{converter}_{sheets}x{rows}_{seed}.xlsx"
+    else:
+        path = Path(work_dir) / f"synth_{converter}_{rows}_{callers}_{seed}.xlsx"
+    if not path.exists():
+        start = time.perf_counter()
+        if converter == "table":
+            generate_workbook(path, term_rows=rows, seed=seed)
+        elif converter == "sheets":
+            generate_workbook(path, term_rows=rows, seed=seed, term_sheets=sheets)
+        else:
+            generate_workbook(path, nameref_rows=rows, callers=callers, seed=seed)
+        print(f"Generated {path.name} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def run_case(converter, workbook, output_dir, engine, reader="auto", sheets=DEFAULT_SHEETS, max_workers=1):
+    """
+    Convert one synthetic workbook and measure it, run in a fresh process so peak RSS is per case
+
+    Peak RSS does not include the worker processes of a parallel "sheets" run. Those inherit the
+    spawn start method of the case process, as on Windows and macOS, so their startup is included.
+
+    Returns:
+        dict: Total and per-phase seconds, peak RSS, record count and converter counters
+    """
+    from instrumentation import Metrics
+    from xls2json import excel_to_json
+    from PersonalSheetParser import nameref_to_json
+
+    metrics = Metrics(quiet=True)
+    output_path = Path(output_dir) / f"{Path(workbook).stem}.json"
+
+    start = time.perf_counter()
+    if converter == "table":
+        excel_to_json(workbook, output_dir, sheets=[TERM_SHEET], header_row=1, columns=["A", "B", "C"],
+                      tag_column=["D"], engine=engine, output_filename=output_path.name, reader=reader,
+                      metrics=metrics)
+    elif converter == "sheets":
+        excel_to_json(workbook, output_dir, sheets=term_sheet_names(sheets), header_row=1, columns=["A", "B", "C"],
+                      tag_column=["D"], engine=engine, output_filename=output_path.name, reader=reader,
+                      metrics=metrics, max_workers=max_workers)
+    else:
+        nameref_to_json(workbook, output_dir, output_path.name, NAMEREF_SHEET, reader=reader, metrics=metrics)
+    total = time.perf_counter() - start
+
+    return {
+        "total": total,
+        "phases": metrics.phase_times(),
+        "peak_rss_mb": peak_rss_mb(),
+        "records": metrics.counters.get("records", 0),
+        "counters": metrics.counters,
+    }
+
+
+def run_benchmarks(converters, sizes, work_dir, engine="vectorized", callers=26, seed=0, repeat=1, reader="auto",
+                   sheets=DEFAULT_SHEETS, workers=None):
+    """
+    Run every converter at every size and collect the results
+
+    Each case runs in its own process. With repeat > 1 the fastest run is kept. The reader is
+    recorded as resolved, so a fallback shows up in the results. A "sheets" case is run with
+    max_workers=1 and with the given workers, its result is the parallel run plus the serial total
+    and the speedup.
+
+    Returns:
+        list: One result dict per (converter, rows) case
+    """
+    work_dir = Path(work_dir)
+    output_dir = work_dir / "output"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    def best_run(converter, workbook, max_workers=1):
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                runs.append(executor.submit(run_case, converter, str(workbook), str(output_dir), engine,
+                                            reader, sheets, max_workers).result())
+        return min(runs, key=lambda run: run["total"])
+
+    for converter in converters:
+        for rows in sizes:
+            workbook = workbook_for(converter, rows, work_dir, callers, seed, sheets)
+            if converter == "sheets":
+                serial = best_run(converter, workbook)
+                best = best_run(converter, workbook, workers)
+            else:
+                best = best_run(converter, workbook)
+
+            result = {"converter": converter, "rows": rows, "reader": resolve_reader(reader, lambda message: None),
+                      **best}
+            if converter == "table":
+                result["engine"] = engine
+            elif converter == "sheets":
+                result.update(engine=engine, sheets=sheets, workers=min(workers or os.cpu_count(), sheets),
+                              serial_total=serial["total"], speedup=serial["total"] / best["total"])
+            else:
+                result["callers"] = callers
+            results.append(result)
+            print_result(result)
+    return results
+
+
+def case_key(result):
+    return f"{result['converter']}/{result['rows']}"
+
+
+def print_result(result):
+    phases = "  ".join(f"{phase} {seconds:.3f}s" for phase, seconds in result["phases"].items())
+    rss = f"{result['peak_rss_mb']:.0f} MiB" if result["peak_rss_mb"] is not None else "n/a"
+    print(f"  {case_key(result):<18} {result['reader']:<8} total {result['total']:.3f}s  {phases}  "
+          f"peak RSS {rss}  ({result['records']} records)")
+    if "speedup" in result:
+        print(f"  {'':<18} {result['sheets']} sheets, serial {result['serial_total']:.3f}s, "
+              f"{result['workers']} workers {result['total']:.3f}s: {result['speedup']:.2f}x speedup")
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Print the change of every case against a baseline run
+
+    Returns:
+        list: Descriptions of totals and phases that got slower by more than the threshold
+    """
+    baseline_cases = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+
+    readers = sorted({result.get("reader", "pandas") for result in baseline["results"]})
+    print(f"\nCompared with baseline from {baseline.get('meta', {}).get('timestamp', 'unknown')} "
+          f"({', '.join(readers)} reader):")
+    for result in results:
+        key = case_key(result)
+        old = baseline_cases.get(key)
+        if old is None:
+            print(f"  {key:<18} not in baseline")
+            continue
+
+        pairs = [("total", old["total"], result["total"])]
+        pairs += [(phase, old["phases"].get(phase), seconds) for phase, seconds in result["phases"].items()]
+
+        changes = []
+        for label, before, after in pairs:
+            if not before:
+                continue
+            change = after / before - 1
+            changes.append(f"{label} {change:+.1%}")
+            # Ignore noise on phases that take a few milliseconds
+            if change > threshold and after - before > 0.005:
+                regressions.append(f"{key} {label}: {before:.3f}s -> {after:.3f}s ({change:+.1%})")
+
+        if old.get("peak_rss_mb") and result["peak_rss_mb"]:
+            changes.append(f"peak RSS {result['peak_rss_mb'] / old['peak_rss_mb'] - 1:+.1%}")
+        print(f"  {key:<18} {'  '.join(changes)}")
+
+    if regressions:
+        print(f"\nRegressions above {threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+    return regressions
+
+
+def environment_info():
+    import openpyxl
+    import pandas as pd
+    from readers import python_calamine
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "openpyxl": openpyxl.__version__,
+        "python_calamine": getattr(python_calamine, "__version__", None),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark excel_to_json and nameref_to_json on synthetic workbooks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Row counts to benchmark (1k to 500k)")
+    parser.add_argument("--converters", nargs="+", choices=CONVERTERS, default=list(DEFAULT_CONVERTERS),
+                        help="Cases to run, 'sheets' measures the parallel speedup of a multi-sheet workbook")
+    parser.add_argument("--engine", default="vectorized", help="Row engine for excel_to_json")
+    parser.add_argument("--reader", choices=READERS, default="auto",
+                        help="Workbook reader backend, compare two backends by passing one run as --baseline of the other")
+    parser.add_argument("--callers", type=int, default=26, help="Caller columns of the 人称表 grid")
+    parser.add_argument("--sheets", type=int, default=DEFAULT_SHEETS,
+                        help="专有名词 sheets of the 'sheets' case, each with the benchmarked row count")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes of the parallel 'sheets' run (defaults to the CPU count)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic workbooks")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case, the fastest is kept")
+    parser.add_argument("--work-dir", default=None,
+                        help="Directory for the workbooks and output, reused between runs (defaults to a temporary directory)")
+    parser.add_argument("-o", "--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown that counts as a regression, e.g. 0.1 for 10%%")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        print(f"Benchmarking {', '.join(args.converters)} at {', '.join(map(str, args.sizes))} rows")
+        results = run_benchmarks(args.converters, args.sizes, work_dir, args.engine, args.callers, args.seed,
+                                 args.repeat, args.reader, args.sheets, args.workers)
+
+    report = {"meta": environment_info(), "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
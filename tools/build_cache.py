@@ -0,0 +1,242 @@
+import hashlib
+import json
+import shutil
+import zipfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from json_stream import write_atomic
+from readers import MAIN_NS, workbook_parts
+
+CACHE_DIR = Path(__file__).parent / ".build_cache"
+
+# Bump when the cache layout or fingerprint format changes
+CACHE_VERSION = 3
+
+# Converter options that affect the generated JSON
+FINGERPRINT_OPTIONS = ("parser", "sheet", "columns", "tag_column", "header_row", "id_field", "start_id",
+                       "minify", "compress", "shard_dir", "search_index", "patch_dir", "id_map_dir", "key_fields",
+                       "reader")
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Data files read by the converters besides the workbook
+TOOL_INPUTS = (Path(__file__).parent.parent / "src" / "assets" / "FuzzySearchDict.json",)
+
+
+def tools_hash():
+    """Hash of the converter sources and data files, so that changes to them invalidate the cache"""
+    h = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")) + list(TOOL_INPUTS):
+        h.update(path.name.encode())
+        if path.exists():
+            h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def _read_shared_strings(archive, part):
+    strings = []
+    if part is None:
+        return strings
+
+    with archive.open(part) as src:
+        for _, element in ET.iterparse(src):
+            if element.tag == f"{MAIN_NS}si":
+                strings.append("".join(t.text or "" for t in element.iter(f"{MAIN_NS}t")))
+                element.clear()
+    return strings
+
+
+def sheet_fingerprints(excel_file, sheet_names):
+    """
+    Fingerprint the cell content of worksheets without loading them through openpyxl
+
+    Shared string references are resolved to their text, so editing one sheet does not change
+    the fingerprint of the others even though the workbook's shared string table changes.
+    Merged ranges and the style table are included as well, since they affect the output.
+
+    Args:
+        excel_file (str): Path to the Excel file
+        sheet_names (list): Sheets to fingerprint
+
+    Returns:
+        dict: Maps each sheet name to a hex digest, or None if the sheet does not exist
+    """
+    fingerprints = {}
+    with zipfile.ZipFile(excel_file) as archive:
+        sheets, shared_strings_part, styles_part = workbook_parts(archive)
+        shared_strings = None
+        styles_hash = ""
+        if styles_part is not None:
+            styles_hash = hashlib.sha256(archive.read(styles_part)).hexdigest()
+
+        for sheet_name in sheet_names:
+            if sheet_name not in sheets:
+                fingerprints[sheet_name] = None
+                continue
+
+            if shared_strings is None:
+                shared_strings = _read_shared_strings(archive, shared_strings_part)
+
+            h = hashlib.sha256(styles_hash.encode())
+            with archive.open(sheets[sheet_name]) as src:
+                for _, element in ET.iterparse(src):
+                    tag = element.tag
+                    if tag == f"{MAIN_NS}c":
+                        data_type = element.get("t", "n")
+                        if data_type == "inlineStr":
+                            # Same value as a shared string, which is how Excel usually saves it
+                            data_type = "s"
+                            value = "".join(t.text or "" for t in element.iter(f"{MAIN_NS}t"))
+                        else:
+                            value = element.findtext(f"{MAIN_NS}v")
+                            if data_type == "s" and value is not None:
+                                value = shared_strings[int(value)]
+                        h.update(f"{element.get('r')}\x1f{data_type}\x1f{element.get('s', '')}\x1f{value}\x1e".encode())
+                    elif tag == f"{MAIN_NS}row":
+                        h.update(f"row {element.get('r')}\x1e".encode())
+                        element.clear()
+                    elif tag == f"{MAIN_NS}mergeCell":
+                        h.update(f"merge {element.get('ref')}\x1e".encode())
+
+            fingerprints[sheet_name] = h.hexdigest()
+
+    return fingerprints
+
+
+def job_config_hash(job):
+    """Hash of the converter options of a manifest job"""
+    options = {key: job.get(key) for key in FINGERPRINT_OPTIONS}
+    options["workbook"] = str(Path(job["workbook"]).resolve())
+    for key in ("shard_dir", "patch_dir", "id_map_dir"):
+        if options[key] is not None:
+            options[key] = str(Path(options[key]).resolve())
+    return hashlib.sha256(json.dumps(options, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def job_fingerprint(job, sheet_hash, code_hash):
+    """Combine the sheet content, converter options and converter code into one fingerprint"""
+    if sheet_hash is None:
+        return None
+    parts = [str(CACHE_VERSION), code_hash, job_config_hash(job), sheet_hash]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class BuildCache:
+    """
+    Persistent record of the last successful conversion of each asset
+
+    The index lives in '{cache_dir}/index.json' and a copy of every generated file (the JSON, its
+    compressed companions and its KV shards) is kept under '{cache_dir}/outputs', so an unchanged
+    asset can be restored without converting it.
+
+    Args:
+        cache_dir (str): Cache directory, defaults to tools/.build_cache
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else CACHE_DIR
+        self.index_path = self.cache_dir / "index.json"
+        self.entries = {}
+
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get("version") == CACHE_VERSION:
+                    self.entries = index.get("entries", {})
+            except (OSError, ValueError):
+                print(f"Warning: Ignoring unreadable build cache index {self.index_path}")
+
+    def evict_stale(self, jobs):
+        """
+        Drop entries for assets that are no longer in the manifest or whose options changed
+
+        Returns:
+            list: Names of the evicted assets
+        """
+        configs = {job["name"]: job_config_hash(job) for job in jobs}
+        evicted = [name for name, entry in self.entries.items()
+                   if configs.get(name) != entry.get("config")]
+        for name in evicted:
+            self.remove(name)
+        return evicted
+
+    def lookup(self, name, fingerprint):
+        """
+        Return the cached output files for an asset if its fingerprint matches
+
+        Returns:
+            list: (cached path, output path) pairs, or None on a cache miss
+        """
+        entry = self.entries.get(name)
+        if fingerprint is None or entry is None or entry.get("fingerprint") != fingerprint:
+            return None
+
+        cached_files = [(self.cache_dir / "outputs" / file_name, Path(output_path))
+                        for file_name, output_path in entry["outputs"]]
+        if not all(cached_path.exists() for cached_path, _ in cached_files):
+            return None
+        return cached_files
+
+    def store(self, job, fingerprint, output_paths):
+        """Record a successful conversion and keep a copy of its output files"""
+        if fingerprint is None:
+            return
+
+        # Drop files of the previous entry that are not part of the new one
+        self.remove(job["name"])
+
+        outputs_dir = self.cache_dir / "outputs"
+        outputs_dir.mkdir(parents=True, exist_ok=True)
+        outputs = []
+        for output_path in output_paths:
+            output_path = Path(output_path).resolve()
+            # Shard files of different assets share names, so key the copies by their full path
+            file_name = f"{hashlib.sha256(str(output_path).encode()).hexdigest()[:16]}_{output_path.name}"
+            shutil.copyfile(output_path, outputs_dir / file_name)
+            outputs.append([file_name, str(output_path)])
+
+        self.entries[job["name"]] = {
+            "config": job_config_hash(job),
+            "fingerprint": fingerprint,
+            "outputs": outputs,
+        }
+
+    def remove(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is not None:
+            for file_name, _ in entry["outputs"]:
+                (self.cache_dir / "outputs" / file_name).unlink(missing_ok=True)
+
+    def save(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.index_path, json.dumps({"version": CACHE_VERSION, "entries": self.entries},
+                                                 ensure_ascii=False, indent=2))
+
+
+def restore_outputs(cached_files):
+    """
+    Copy cached output files back to their output paths, skipping files that are already identical
+
+    Args:
+        cached_files (list): (cached path, output path) pairs from BuildCache.lookup
+
+    Returns:
+        int: Number of files copied
+    """
+    copied = 0
+    for cached_path, output_path in cached_files:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_path.exists() and _file_hash(output_path) == _file_hash(cached_path):
+            continue
+        shutil.copyfile(cached_path, output_path)
+        copied += 1
+    return copied
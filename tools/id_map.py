@@ -0,0 +1,126 @@
+import hashlib
+import json
+from pathlib import Path
+
+from json_stream import compact_json, write_atomic
+
+ID_MAP_VERSION = 1
+
+
+def _key_hash(key):
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def id_map_path_for(id_map_dir, name):
+    """Id map file of an asset, '{id_map_dir}/{name}.ids.json'"""
+    return Path(id_map_dir) / f"{name}.ids.json"
+
+
+class SequentialIds:
+    """Positional ids: start_id, start_id + 1, ... in output order"""
+
+    def __init__(self, start_id=0):
+        self.next_id = start_id
+        self.duplicates = 0
+
+    def assign(self, record):
+        record_id = self.next_id
+        self.next_id += 1
+        return record_id
+
+
+class StableIds:
+    """
+    Ids of one array of an IdMap, looked up by natural key and allocated for new keys
+
+    Records sharing a natural key are told apart by their occurrence, so the second one gets
+    the id of the previous run's second one. Occurrences are counted by key hash, so the keys
+    themselves are not kept.
+    """
+
+    def __init__(self, entry, key_fields, id_field):
+        self.entry = entry
+        self.key_fields = key_fields
+        self.id_field = id_field
+        self.duplicates = 0
+        self.added = 0
+        self._seen = {}
+
+    def natural_key(self, record):
+        """The key fields of a record"""
+        return compact_json([record.get(field) for field in self.key_fields])
+
+    def assign(self, record):
+        key = self.natural_key(record)
+        digest = _key_hash(key)
+        occurrence = self._seen.get(digest, 0)
+        self._seen[digest] = occurrence + 1
+        if occurrence:
+            self.duplicates += 1
+            digest = _key_hash(compact_json([key, occurrence]))
+
+        ids = self.entry["ids"]
+        record_id = ids.get(digest)
+        if record_id is None:
+            record_id = self.entry["nextId"]
+            self.entry["nextId"] += 1
+            ids[digest] = record_id
+            self.added += 1
+        return record_id
+
+
+class IdMap:
+    """
+    Persistent map from the natural key of a record to its id
+
+    Ids of records seen before never change, so inserting or deleting rows no longer shifts the
+    ids below them. New keys get the next unused id of their array, starting at start_id, so on
+    the first run the ids match the positional ones. Ids of deleted records are kept and never
+    reused. Keys are stored as hashes, one map per top-level array of the asset.
+
+    Args:
+        path (str): Map file, created on save() if it does not exist
+        key_fields (list): Fields that identify a record, e.g. ["原名", "Tag_0"]. Required: keyed
+            by the whole record, editing a translation would give the record a new id
+        id_field (str): Field holding the id, left out of the key
+        start_id (int): First id allocated in each array
+    """
+
+    def __init__(self, path, key_fields, id_field="id", start_id=0):
+        if not key_fields:
+            raise ValueError(f"Id map {path} needs key fields, e.g. [\"原名\", \"Tag_0\"], so that edited "
+                             f"records keep their id")
+        self.path = Path(path)
+        self.key_fields = list(key_fields)
+        self.id_field = id_field
+        self.start_id = start_id
+        self.arrays = {}
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("keyFields") != self.key_fields:
+                raise ValueError(f"Id map {self.path} was built with key fields {data.get('keyFields')}, "
+                                 f"not {self.key_fields}. Delete it to allocate new ids")
+            self.arrays = data["arrays"]
+            self._check()
+
+    def _check(self):
+        """Make sure no two keys share an id, e.g. after a bad merge of the map file"""
+        for key, entry in self.arrays.items():
+            ids = list(entry["ids"].values())
+            if len(set(ids)) != len(ids):
+                raise ValueError(f"Id map {self.path} assigns the same id to several records of '{key}'")
+            if ids and max(ids) >= entry["nextId"]:
+                raise ValueError(f"Id map {self.path} has ids of '{key}' at or above nextId {entry['nextId']}")
+
+    def array(self, key):
+        """Id allocator for one top-level array"""
+        entry = self.arrays.setdefault(key, {"nextId": self.start_id, "ids": {}})
+        return StableIds(entry, self.key_fields, self.id_field)
+
+    def save(self):
+        """Write the map, call once the output using the ids is complete"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": ID_MAP_VERSION, "keyFields": self.key_fields, "arrays": self.arrays}
+        write_atomic(self.path, compact_json(data))
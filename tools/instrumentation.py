@@ -0,0 +1,151 @@
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Phases reported by the converters, in pipeline order
+PHASES = ("load", "resolve", "classify", "extract", "serialize")
+
+
+class JsonLinesSink:
+    """
+    Append metrics events to a JSON lines file, one object per line
+
+    Args:
+        target (str or file): Path to append to, or an open text stream such as sys.stderr
+    """
+
+    def __init__(self, target):
+        if hasattr(target, "write"):
+            self._file = target
+            self._owned = False
+        else:
+            self._file = open(Path(target), 'a', encoding='utf-8')
+            self._owned = True
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+
+
+class EventBuffer:
+    """Keep metrics events in memory, e.g. to send them from a worker process back to the parent"""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class Metrics:
+    """
+    Timers, counters and progress messages of a conversion
+
+    The converters report through a Metrics object instead of printing directly. Phases are
+    "load" (reading the workbook), "resolve" (column resolution), "classify" (header, tag and END
+    row detection), "extract" (building the records) and "serialize" (writing them out). Records
+    are streamed, so extract and serialize alternate and each call adds to the phase's total.
+    Events that happen once per row are counted rather than logged.
+
+    Args:
+        quiet (bool): Only print warnings, not progress messages
+        sink (JsonLinesSink): Receives every message and report as a JSON object
+        echo (bool): Print messages at all. Worker processes leave them to an EventBuffer, and the
+            parent passes them on in order with merge()
+
+    Example:
+        metrics = Metrics(quiet=True, sink=JsonLinesSink("metrics.jsonl"))
+        excel_to_json(path, metrics=metrics)
+        print(metrics.timers, metrics.counters)
+    """
+
+    def __init__(self, quiet=False, sink=None, echo=True):
+        self.quiet = quiet
+        self.sink = sink
+        self.echo = echo
+        self.timers = {}
+        self.counters = {}
+
+    def add_time(self, phase, seconds):
+        self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def iter_phases(self, iterable, first_phase, rest_phase):
+        """
+        Time a generator, charging the wait for its first item to one phase and the rest to another
+
+        Used for the row engines, which do their whole-sheet classification before yielding the
+        first record and then build records one at a time.
+        """
+        iterator = iter(iterable)
+        phase = first_phase
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(phase, time.perf_counter() - start)
+                return
+            self.add_time(phase, time.perf_counter() - start)
+            phase = rest_phase
+            yield item
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def log(self, message, level="info"):
+        """Print a progress message unless quiet, and pass it to the sink"""
+        if self.echo and (level != "info" or not self.quiet):
+            print(message)
+        self.emit("log", level=level, message=message)
+
+    def warn(self, message):
+        self.log(message, level="warning")
+
+    def emit(self, event, **fields):
+        if self.sink is not None:
+            self.sink.write({"time": time.time(), "event": event, **fields})
+
+    def phase_times(self):
+        """Timers in seconds, in pipeline order"""
+        ordered = {phase: self.timers[phase] for phase in PHASES if phase in self.timers}
+        ordered.update((phase, seconds) for phase, seconds in self.timers.items() if phase not in ordered)
+        return ordered
+
+    def as_dict(self):
+        return {"timers": self.phase_times(), "counters": dict(self.counters)}
+
+    def merge(self, snapshot, events=()):
+        """
+        Add the timers and counters of another Metrics and pass on its log messages
+
+        Args:
+            snapshot (dict): The other Metrics' as_dict()
+            events (list): Events of its EventBuffer
+        """
+        for phase, seconds in snapshot["timers"].items():
+            self.add_time(phase, seconds)
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+        for event in events:
+            if event["event"] == "log":
+                self.log(event["message"], event["level"])
+
+    def report(self, event, **fields):
+        """Send the current timers and counters to the sink, e.g. at the end of a conversion"""
+        self.emit(event, **fields, **self.as_dict())
@@ -0,0 +1,169 @@
+import json
+import os
+from pathlib import Path
+
+from json_stream import StreamWriter, compact_json, tmp_path_for, write_atomic
+
+# Bump when the offset index layout changes
+OFFSETS_VERSION = 1
+
+# Write buffer of a JSON Lines file, so a sheet is written in a few large writes
+BUFFER_SIZE = 1 << 20
+
+
+def offsets_path_for(jsonl_path):
+    """Offset index written next to a JSON Lines file, 'name.offsets.json' for 'name.jsonl'"""
+    jsonl_path = Path(jsonl_path)
+    return jsonl_path.with_name(f"{jsonl_path.stem}.offsets.json")
+
+
+class JsonLinesWriter(StreamWriter):
+    """
+    Write each top-level array as a JSON Lines file, one minified record per line
+
+    Replaces the one-file-per-row output: every array goes into '{output_dir}/{prefix}_{key}.jsonl'
+    through a large write buffer, plus an offset index '{prefix}_{key}.offsets.json' that
+    locates each record by id without reading the rest of the file:
+
+        {
+            "version": 1,
+            "idField": "id",
+            "count": 3,
+            "ids": [0, 1, 2],
+            "offsets": [0, 51, 120, 188]    byte range of record i is offsets[i]:offsets[i + 1]
+        }
+
+    Files are written next to the target and moved into place when the array is complete.
+
+    Args:
+        output_dir (str): Directory receiving the files
+        prefix (str): File name prefix, as for the per-row files
+        id_field (str): Record field holding the id
+    """
+
+    def __init__(self, output_dir, prefix, id_field="id"):
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.id_field = id_field
+        self.arrays = 0
+        self.items = 0
+        self.written = []  # Paths of the finished JSON Lines files
+        self._current = None
+
+    def open(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key):
+        """JSON Lines file of a top-level array"""
+        return self.output_dir / f"{self.prefix}_{key}.jsonl"
+
+    def begin_array(self, key):
+        """Start the JSON Lines file of a top-level array"""
+        self.end_array()
+
+        path = self.path_for(key)
+        tmp_path = tmp_path_for(path)
+        self._current = {
+            "path": path,
+            "tmp_path": tmp_path,
+            "file": open(tmp_path, 'wb', buffering=BUFFER_SIZE),
+            "ids": [],
+            "offsets": [0],
+        }
+        self.arrays += 1
+        self.items = 0
+
+    def write_item(self, item):
+        """Append one record as a line"""
+        current = self._current
+        if current is None:
+            raise RuntimeError("write_item() called before begin_array()")
+
+        line = (compact_json(item) + "\n").encode('utf-8')
+        current["file"].write(line)
+        current["ids"].append(item.get(self.id_field))
+        current["offsets"].append(current["offsets"][-1] + len(line))
+        self.items += 1
+
+    def end_array(self):
+        """Finish the current file and its offset index and move them into place"""
+        current = self._current
+        if current is None:
+            return
+
+        current["file"].close()
+        offsets = {
+            "version": OFFSETS_VERSION,
+            "idField": self.id_field,
+            "count": len(current["ids"]),
+            "ids": current["ids"],
+            "offsets": current["offsets"],
+        }
+        os.replace(current["tmp_path"], current["path"])
+        write_atomic(offsets_path_for(current["path"]), compact_json(offsets))
+        self.written.append(current["path"])
+        self._current = None
+
+    def close(self):
+        self.end_array()
+
+    def abort(self):
+        """Discard the file being written, finished arrays are kept"""
+        current = self._current
+        if current is None:
+            return
+
+        current["file"].close()
+        current["tmp_path"].unlink(missing_ok=True)
+        self._current = None
+
+
+class JsonLinesReader:
+    """
+    Read single records of a file written by JsonLinesWriter, using its offset index
+
+    Args:
+        jsonl_path (str): JSON Lines file
+
+    Example:
+        with JsonLinesReader("output/PJS翻译资料_25用专业名词表.jsonl") as rows:
+            record = rows.get(42)
+    """
+
+    def __init__(self, jsonl_path):
+        self.path = Path(jsonl_path)
+        with open(offsets_path_for(self.path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.id_field = index["idField"]
+        self.ids = index["ids"]
+        self.offsets = index["offsets"]
+        # The first record wins if an id is repeated
+        self.positions = {}
+        for i, record_id in enumerate(self.ids):
+            self.positions.setdefault(record_id, i)
+        self._file = open(self.path, 'rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, record_id):
+        """The record with this id, or None"""
+        position = self.positions.get(record_id)
+        if position is None:
+            return None
+        return self.read_at(position)
+
+    def read_at(self, position):
+        """The record on a 0-based line"""
+        start, end = self.offsets[position], self.offsets[position + 1]
+        self._file.seek(start)
+        return json.loads(self._file.read(end - start).decode('utf-8'))
+
+    def close(self):
+        self._file.close()
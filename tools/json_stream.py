@@ -0,0 +1,246 @@
+import json
+import os
+import time
+from pathlib import Path
+
+
+def compact_json(value):
+    """Serialize like JSON.stringify, the form hashed for patches and id maps"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def tmp_path_for(path):
+    """Temporary path next to a file or directory, moved into place once it is complete"""
+    path = Path(path)
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def write_atomic(path, data):
+    """
+    Write a file through a temporary file, so readers never see a partial file
+
+    Args:
+        path (str): File path
+        data (str or bytes): Content, text is written as UTF-8
+    """
+    tmp_path = tmp_path_for(path)
+    if isinstance(data, str):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+    else:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+class StreamWriter:
+    """
+    Base class of the writers the converters stream their records into
+
+    A writer receives a JSON object of arrays one record at a time: open(), then begin_array(key)
+    and write_item(record) for each array, end_array(), and close() once everything is written.
+    abort() discards the output instead. As a context manager the writer is opened on entry,
+    closed when the block completes and aborted when it raises.
+    """
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonStreamWriter(StreamWriter):
+    """
+    Write a JSON object of arrays ({"key": [record, ...], ...}) one record at a time
+
+    The output is byte-identical to json.dump(data, f, ensure_ascii=False, indent=indent), or to
+    json.dump(data, f, ensure_ascii=False, separators=(',', ':')) when indent is None, but only
+    the record being written is held in memory. The file is written to a temporary file
+    next to the target and moved into place on close, so readers never see a partial file.
+
+    Args:
+        path (str): Output file path
+        indent (int): Indentation, as for json.dump. None writes minified JSON
+
+    Example:
+        with JsonStreamWriter(path) as writer:
+            writer.begin_array("人称表")
+            for record in records:
+                writer.write_item(record)
+    """
+
+    def __init__(self, path, indent=2):
+        self.path = Path(path)
+        self.indent = indent
+        self.arrays = 0  # Number of arrays written
+        self.items = 0  # Number of items written in the current array
+        self._in_array = False
+        self._file = None
+        self._tmp_path = None
+
+    def open(self):
+        self._tmp_path = tmp_path_for(self.path)
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        self._file.write("{")
+
+    def _newline(self, level):
+        """Line break and indentation for a nesting level, nothing when minified"""
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def begin_array(self, key):
+        """Start a new top-level key whose value is an array"""
+        self.end_array()
+
+        separator = "," if self.arrays else ""
+        key_separator = ":" if self.indent is None else ": "
+        self._file.write(f"{separator}{self._newline(1)}{json.dumps(key, ensure_ascii=False)}{key_separator}[")
+        self.arrays += 1
+        self.items = 0
+        self._in_array = True
+
+    def write_item(self, item):
+        """Append one item to the current array"""
+        if not self._in_array:
+            raise RuntimeError("write_item() called before begin_array()")
+
+        if self.indent is None:
+            encoded = compact_json(item)
+        else:
+            encoded = json.dumps(item, ensure_ascii=False, indent=self.indent)
+            encoded = encoded.replace("\n", self._newline(2))
+
+        separator = "," if self.items else ""
+        self._file.write(f"{separator}{self._newline(2)}{encoded}")
+        self.items += 1
+
+    def end_array(self):
+        """Close the current array, if any (begin_array and close do this automatically)"""
+        if not self._in_array:
+            return
+
+        if self.items:
+            self._file.write(f"{self._newline(1)}]")
+        else:
+            self._file.write("]")
+        self._in_array = False
+
+    def close(self):
+        """Finish the JSON object and move the file into place"""
+        if self._file is None:
+            return
+
+        self.end_array()
+        self._file.write(f"{self._newline(0)}}}" if self.arrays else "}")
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discard the partially written file"""
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class RecordCollector(StreamWriter):
+    """
+    Keep records in memory instead of writing them
+
+    Lets the converters hand their records to code that validates, indexes or chunks them
+    without reading the JSON back from disk. Only use it where the whole asset fits in memory.
+
+    Attributes:
+        data (dict): Maps each array key to its list of records, in the order they were written
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.arrays = 0
+        self.items = 0
+        self._current = None
+
+    def open(self):
+        self.data = {}
+
+    def begin_array(self, key):
+        self._current = self.data.setdefault(key, [])
+        self.arrays += 1
+        self.items = 0
+
+    def write_item(self, item):
+        if self._current is None:
+            raise RuntimeError("write_item() called before begin_array()")
+        self._current.append(item)
+        self.items += 1
+
+    def end_array(self):
+        self._current = None
+
+    def close(self):
+        self.end_array()
+
+    def abort(self):
+        """Drop the collected records"""
+        self._current = None
+        self.data = {}
+
+
+class TeeWriter(StreamWriter):
+    """
+    Forward records to several writers
+
+    If any writer fails, all of them are aborted.
+
+    Args:
+        writers (list): Writers to forward to, e.g. a JsonStreamWriter and a KvShardWriter
+        metrics (Metrics): Charged with the time spent writing, as the "serialize" phase
+    """
+
+    def __init__(self, writers, metrics=None):
+        self.writers = list(writers)
+        self.metrics = metrics
+        self.arrays = 0
+        self.items = 0
+
+    def open(self):
+        for writer in self.writers:
+            writer.open()
+
+    def begin_array(self, key):
+        for writer in self.writers:
+            writer.begin_array(key)
+        self.arrays += 1
+        self.items = 0
+
+    def write_item(self, item):
+        start = time.perf_counter()
+        for writer in self.writers:
+            writer.write_item(item)
+        self.items += 1
+        if self.metrics is not None:
+            self.metrics.add_time("serialize", time.perf_counter() - start)
+
+    def end_array(self):
+        for writer in self.writers:
+            writer.end_array()
+
+    def close(self):
+        start = time.perf_counter()
+        for writer in self.writers:
+            writer.close()
+        if self.metrics is not None:
+            self.metrics.add_time("serialize", time.perf_counter() - start)
+
+    def abort(self):
+        for writer in self.writers:
+            writer.abort()
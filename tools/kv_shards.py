@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+from json_stream import StreamWriter, compact_json, tmp_path_for, write_atomic
+
+# Item budget per chunk, the size saveJsonToKV passes to splitLargeObject for array data
+MAX_CHUNK_BYTES = 40000
+
+# Largest value saveJsonToKV accepts for a single KV entry
+KV_VALUE_LIMIT = 60000
+
+
+class KvShardWriter(StreamWriter):
+    """
+    Write converter output as pre-chunked Deno KV values in the layout of jsonChunker.ts
+
+    Each top-level array becomes one shard set in '{shard_dir}/{kv_key}/':
+        chunk_0000.json, ...  chunk values, {rootKey: [...], "_chunkIndex": i, "_totalChunks": n}
+        manifest.json         the "json_data" metadata value plus byte sizes and item ranges per chunk,
+                              and once record_source() is called the asset file the shards were cut from
+
+    Items are packed like splitLargeObject, but sizes are measured in UTF-8 bytes instead of JS
+    string length. Only the chunk being filled is held in memory.
+
+    Args:
+        shard_dir (str): Directory that receives one sub-directory per shard set
+        kv_keys (dict): Maps array keys to KV keys, defaults to the array key itself
+        max_chunk_bytes (int): Item budget per chunk
+        warn (callable): Called with a message for oversized items and chunks, e.g. Metrics.warn
+    """
+
+    def __init__(self, shard_dir, kv_keys=None, max_chunk_bytes=MAX_CHUNK_BYTES, warn=print):
+        self.shard_dir = Path(shard_dir)
+        self.kv_keys = kv_keys or {}
+        self.max_chunk_bytes = max_chunk_bytes
+        self.warn = warn
+        self.arrays = 0
+        self.items = 0
+        self.written = []  # Paths of the finished shard sets
+        self._current = None
+
+    def open(self):
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+
+    def begin_array(self, key):
+        """Start a new shard set for a top-level array"""
+        self.end_array()
+
+        kv_key = self.kv_keys.get(key, key)
+        tmp_dir = tmp_path_for(self.shard_dir / kv_key)
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir()
+
+        self._current = {
+            "root_key": key,
+            "kv_key": kv_key,
+            "tmp_dir": tmp_dir,
+            "chunks": [],
+            "pending": [],  # Encoded items of the chunk being filled
+            "pending_bytes": 0,
+            "first_item": 0,
+            # Size of JSON.stringify({rootKey: [...]}) without the items and their commas
+            "original_size": len(f'{{{compact_json(key)}:[]}}'.encode('utf-8')),
+        }
+        self.arrays += 1
+        self.items = 0
+
+    def write_item(self, item):
+        """Append one item to the current shard set"""
+        current = self._current
+        if current is None:
+            raise RuntimeError("write_item() called before begin_array()")
+
+        encoded = compact_json(item)
+        item_bytes = len(encoded.encode('utf-8'))
+        current["original_size"] += item_bytes + (1 if self.items else 0)
+
+        if item_bytes > self.max_chunk_bytes:
+            self.warn(f"Warning: Item {self.items} of '{current['root_key']}' is {item_bytes} bytes, storing it as its own chunk")
+            self._flush_chunk()
+            current["pending"].append(encoded)
+            current["pending_bytes"] = item_bytes
+            self._flush_chunk()
+        else:
+            if current["pending_bytes"] + item_bytes > self.max_chunk_bytes:
+                self._flush_chunk()
+            current["pending"].append(encoded)
+            current["pending_bytes"] += item_bytes
+
+        self.items += 1
+
+    def _flush_chunk(self):
+        """Write the chunk being filled; "_totalChunks" is appended once the count is known"""
+        current = self._current
+        if not current["pending"]:
+            return
+
+        index = len(current["chunks"])
+        file_name = f"chunk_{index:04d}.json"
+        head = f'{{{compact_json(current["root_key"])}:[{",".join(current["pending"])}],"_chunkIndex":{index},"_totalChunks":'
+        with open(current["tmp_dir"] / file_name, 'w', encoding='utf-8') as f:
+            f.write(head)
+
+        item_count = len(current["pending"])
+        current["chunks"].append({
+            "file": file_name,
+            "bytes": len(head.encode('utf-8')),
+            "items": [current["first_item"], current["first_item"] + item_count],
+        })
+        current["first_item"] += item_count
+        current["pending"] = []
+        current["pending_bytes"] = 0
+
+    def end_array(self):
+        """Finish the current shard set and move it into place"""
+        current = self._current
+        if current is None:
+            return
+
+        self._flush_chunk()
+        total = len(current["chunks"])
+        tail = f"{total}}}"
+        for chunk in current["chunks"]:
+            with open(current["tmp_dir"] / chunk["file"], 'a', encoding='utf-8') as f:
+                f.write(tail)
+            chunk["bytes"] += len(tail)
+            if chunk["bytes"] > KV_VALUE_LIMIT:
+                self.warn(f"Warning: {chunk['file']} of '{current['kv_key']}' is {chunk['bytes']} bytes, above the {KV_VALUE_LIMIT} byte KV limit")
+
+        manifest = {
+            "key": current["kv_key"],
+            "meta": {
+                "chunked": True,
+                "chunksCount": total,
+                "rootKey": current["root_key"],
+                "dataType": "array",
+                "originalSize": current["original_size"],
+            },
+            "maxChunkBytes": self.max_chunk_bytes,
+            "items": self.items,
+            "chunks": current["chunks"],
+        }
+        with open(current["tmp_dir"] / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # Replace the previous shard set
+        target = self.shard_dir / current["kv_key"]
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(current["tmp_dir"], target)
+
+        self.written.append(target)
+        self._current = None
+
+    def close(self):
+        self.end_array()
+
+    def record_source(self, source_path):
+        """
+        Record the asset file in the manifests of the written shard sets, once the file is complete
+
+        migrateJsonToKV.jsx only uploads a shard set when the SHA-256 of the asset it migrates
+        matches, so shards left over from an earlier conversion are never pushed to KV.
+        """
+        source_path = Path(source_path)
+        source = {"file": source_path.name, "sha256": hashlib.sha256(source_path.read_bytes()).hexdigest()}
+        for shard_path in self.written:
+            manifest = read_shard_manifest(shard_path)
+            manifest["source"] = source
+            write_atomic(shard_path / "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+
+    def abort(self):
+        """Discard the shard set being written"""
+        if self._current is not None:
+            shutil.rmtree(self._current["tmp_dir"], ignore_errors=True)
+            self._current = None
+
+
+def read_shard_manifest(shard_path):
+    """Read 'manifest.json' of a shard set written by KvShardWriter"""
+    with open(Path(shard_path) / "manifest.json", 'r', encoding='utf-8') as f:
+        return json.load(f)
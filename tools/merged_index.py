@@ -0,0 +1,53 @@
+class MergedCellIndex:
+    """
+    Per-cell lookup table for merged ranges, answering "is this cell merged" in O(1)
+
+    Coordinates are 0-based (row, column) positions, the same as DataFrame.iat / iloc.
+
+    Args:
+        merged_cells (list): Merged ranges as dicts with 1-based min_row, max_row, min_col and max_col
+            (the format of SheetGrid.merged_cells)
+        values (DataFrame): Optional cell values used to look up the anchor value of a merged cell
+    """
+
+    def __init__(self, merged_cells, values=None):
+        self.values = values
+        self._anchors = {}
+
+        for mc in merged_cells:
+            anchor = (mc['min_row'] - 1, mc['min_col'] - 1)
+            for row in range(mc['min_row'] - 1, mc['max_row']):
+                for col in range(mc['min_col'] - 1, mc['max_col']):
+                    self._anchors[(row, col)] = anchor
+
+    @classmethod
+    def from_grid(cls, grid):
+        """Build the index for a SheetGrid, using its frame for anchor values"""
+        return cls(grid.merged_cells, grid.frame)
+
+    def __len__(self):
+        """Number of cells covered by merged ranges"""
+        return len(self._anchors)
+
+    def __contains__(self, cell):
+        return cell in self._anchors
+
+    def is_merged(self, row, col):
+        """Check whether (row, col) is part of a merged range"""
+        return (row, col) in self._anchors
+
+    def anchor(self, row, col):
+        """Top-left cell (row, col) of the merged range containing the cell, or None if it is not merged"""
+        return self._anchors.get((row, col))
+
+    def anchor_value(self, row, col):
+        """Value of the top-left cell of the merged range containing the cell, or None if it is not merged"""
+        anchor = self._anchors.get((row, col))
+        if anchor is None or self.values is None:
+            return None
+
+        anchor_row, anchor_col = anchor
+        num_rows, num_cols = self.values.shape
+        if anchor_row >= num_rows or anchor_col >= num_cols:
+            return None
+        return self.values.iat[anchor_row, anchor_col]
@@ -6,6 +6,41 @@ import {
   getObjectSize,
 } from "../backend/cmd/server/jsonChunker.ts";
 
+// Python 转换工具 (--shards) 预先分块好的 KV 数据目录
+const SHARDS_DIR = "../kv_shards";
+
+// 读取预分块数据的清单，不存在时返回 null
+async function readShardManifest(key) {
+  try {
+    const content = await Deno.readTextFile(`${SHARDS_DIR}/${key}/manifest.json`);
+    return JSON.parse(content);
+  } catch (error) {
+    if (error instanceof Deno.errors.NotFound) return null;
+    throw error;
+  }
+}
+
+// 文件内容的 SHA-256 (十六进制)
+async function sha256Hex(bytes) {
+  const digest = await crypto.subtle.digest("SHA-256", bytes);
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+// 直接上传预分块数据，布局与 saveJsonToKV 的数组分块一致
+async function saveShardsToKV(kv, key, manifest) {
+  await kv.set(["json_data", key], manifest.meta);
+
+  for (const [i, chunk] of manifest.chunks.entries()) {
+    const content = await Deno.readTextFile(`${SHARDS_DIR}/${key}/${chunk.file}`);
+    await kv.set(["json_data_chunk", key, i], JSON.parse(content));
+    console.log(
+      `  ✓ 块 ${i + 1}/${manifest.chunks.length} 已保存 (${chunk.bytes} 字节, 条目 ${chunk.items[0]}-${chunk.items[1]})`
+    );
+  }
+
+  return { success: true, chunked: true, chunks: manifest.chunks.length };
+}
+
 async function migrateJsonToKV() {
   try {
     console.log("开始迁移JSON文件到Deno KV...");
@@ -28,8 +63,23 @@ async function migrateJsonToKV() {
         const filePath = `../public/assets/${filename}`;
         console.log(`\n处理文件: ${filePath}`);
 
-        const content = await Deno.readTextFile(filePath);
-        const jsonData = JSON.parse(content);
+        const bytes = await Deno.readFile(filePath);
+
+        // 有预分块数据且与当前文件一致时直接上传，无需重新分块
+        const manifest = await readShardManifest(key);
+        if (manifest) {
+          const hash = await sha256Hex(bytes);
+          if (manifest.source?.sha256 === hash) {
+            console.log(`使用预分块数据: ${SHARDS_DIR}/${key}`);
+            const result = await saveShardsToKV(kv, key, manifest);
+            console.log(`✅ 成功迁移(预分块): ${filename} (${result.chunks}块)`);
+            chunkedCount++;
+            return true;
+          }
+          console.warn(`警告: ${SHARDS_DIR}/${key} 的预分块数据与 ${filename} 不一致(已过期)，改为重新分块`);
+        }
+
+        const jsonData = JSON.parse(new TextDecoder().decode(bytes));
 
         // 检查文件大小
         const dataSize = getObjectSize(jsonData);
@@ -106,6 +156,8 @@ async function migrateJsonToKV() {
     // 遍历文件夹
     for await (const entry of Deno.readDir("../public/assets")) {
       if (!entry.isFile || !entry.name.endsWith(".json")) continue;
+      // 搜索索引只作为静态文件提供
+      if (entry.name.endsWith(".index.json")) continue;
 
       fileCount++;
       const success = await migrateFile(entry.name);
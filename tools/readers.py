@@ -0,0 +1,574 @@
+import io
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from pathlib import Path, PurePosixPath
+
+import numpy as np
+import pandas as pd
+import openpyxl
+from openpyxl.utils.cell import column_index_from_string, get_column_letter, range_boundaries
+from pandas.errors import ParserError
+from pandas.io.parsers import TextParser
+# Strings pandas reads as NaN by default
+from pandas._libs.parsers import STR_NA_VALUES
+
+try:
+    # Internal openpyxl parser, lets us stream cell rows and merged ranges in one pass
+    from openpyxl.worksheet._reader import INLINE_STRING, VALUE_TAG, WorkSheetParser
+except ImportError:
+    WorkSheetParser = None
+
+try:
+    # Rust-based reader used by pandas' engine="calamine" (pandas >= 2.2)
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# Reader backends, "auto" picks the fastest one that is installed
+#   calamine  pandas engine="calamine", merged ranges scanned from the sheet XML
+#   openpyxl  streams the sheet XML through openpyxl's parser without building cell objects
+#   pandas    pd.read_excel with the openpyxl engine, the original code path
+READERS = ("auto", "calamine", "openpyxl", "pandas")
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_MERGE_CELL_REF = re.compile(rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([^"]+)"')
+
+_DIGITS = "0123456789"
+
+
+def resolve_reader(reader="auto", warn=print):
+    """
+    Pick the backend to use for a requested reader, falling back when it is not installed
+
+    Args:
+        reader (str): One of READERS
+        warn (callable): Called with a message when falling back
+
+    Returns:
+        str: "calamine", "openpyxl" or "pandas"
+    """
+    if reader not in READERS:
+        raise ValueError(f"Unknown reader '{reader}', expected one of: {', '.join(READERS)}")
+
+    if reader == "auto":
+        reader = "calamine" if python_calamine is not None else "openpyxl"
+    if reader == "calamine" and python_calamine is None:
+        warn("Warning: python-calamine is not installed, falling back to the openpyxl reader")
+        reader = "openpyxl"
+    if reader == "openpyxl" and WorkSheetParser is None:
+        warn("Warning: openpyxl's streaming parser is unavailable, falling back to the pandas reader")
+        reader = "pandas"
+    return reader
+
+
+def workbook_parts(archive):
+    """Map sheet names to their XML part, and find the shared strings and styles parts"""
+    rels = {}
+    with archive.open("xl/_rels/workbook.xml.rels") as src:
+        for rel in ET.parse(src).getroot().iter(f"{PKG_REL_NS}Relationship"):
+            target = rel.get("Target")
+            # Targets are relative to xl/ unless absolute
+            if target.startswith("/"):
+                target = target.lstrip("/")
+            else:
+                target = str(PurePosixPath("xl") / target)
+            rels[rel.get("Id")] = (rel.get("Type", ""), target)
+
+    sheets = {}
+    with archive.open("xl/workbook.xml") as src:
+        for sheet in ET.parse(src).getroot().iter(f"{MAIN_NS}sheet"):
+            sheets[sheet.get("name")] = rels[sheet.get(f"{REL_NS}id")][1]
+
+    shared_strings = styles = None
+    for rel_type, target in rels.values():
+        if rel_type.endswith("/sharedStrings"):
+            shared_strings = target
+        elif rel_type.endswith("/styles"):
+            styles = target
+
+    return sheets, shared_strings, styles
+
+
+def scan_merged_refs(excel_file, sheet_name):
+    """
+    Read the merged range references of a sheet straight from its XML
+
+    <mergeCells> follows <sheetData>, so the part is decompressed and searched for it without
+    parsing any cells. Used by the readers that do not report merged ranges themselves.
+
+    Returns:
+        list: Range references such as "B3:C3"
+    """
+    with zipfile.ZipFile(excel_file) as archive:
+        sheets, _, _ = workbook_parts(archive)
+        with archive.open(sheets[sheet_name]) as src:
+            tail = b""
+            found = None
+            for block in iter(lambda: src.read(1 << 20), b""):
+                if found is not None:
+                    found += block
+                    continue
+                data = tail + block
+                start = data.find(b"mergeCells")
+                if start >= 0:
+                    found = data[start:]
+                else:
+                    tail = data[-16:]
+
+    if found is None:
+        return []
+    return [ref.decode() for ref in _MERGE_CELL_REF.findall(found)]
+
+
+def merged_range(ref):
+    """Turn a range reference such as "B3:C3" into a merged cell dict with 1-based bounds"""
+    min_col, min_row, max_col, max_row = range_boundaries(ref)
+    return {
+        'min_row': min_row,
+        'max_row': max_row,
+        'min_col': min_col,
+        'max_col': max_col
+    }
+
+
+def _is_blank(value):
+    """Whether a converted cell value is NaN once pandas parses it"""
+    if isinstance(value, str):
+        return value in STR_NA_VALUES
+    return isinstance(value, float) and np.isnan(value)
+
+
+def _keeps_nan(kinds):
+    """
+    Whether the empty cells of a column holding these values stay NaN through where(notnull, None)
+
+    pandas infers the column dtype from the kinds of values it holds, so one value of each kind is
+    enough. Only object columns turn NaN into None.
+
+    Args:
+        kinds (set): (type, value) pairs of the column's values
+    """
+    rows = [[value] for _, value in kinds] + [[""]]
+    return TextParser(rows, header=None, skip_blank_lines=False).read()[0].dtype != object
+
+
+class _OtherColumn:
+    """
+    Values of a skipped column, collected until the column is known to be an object column
+
+    The dtype is checked each time the number of distinct values doubles, so a column of text is
+    told apart at its first value.
+
+    Attributes:
+        kinds (set): (type, value) pairs of the values, None once the column is known to be an
+            object column
+        rows (list): 0-based sheet rows holding a value, None once the column is known to be an
+            object column
+    """
+
+    __slots__ = ("kinds", "rows", "check_at")
+
+    def __init__(self):
+        self.kinds = set()
+        self.rows = []
+        self.check_at = 1
+
+    def add(self, row, value):
+        if self.kinds is None:
+            return
+        self.kinds.add((type(value), value))
+        self.rows.append(row)
+        if len(self.kinds) >= self.check_at:
+            if _keeps_nan(self.kinds):
+                self.check_at *= 2
+            else:
+                self.kinds = self.rows = None
+
+
+if WorkSheetParser is not None:
+    class _ColumnSheetParser(WorkSheetParser):
+        """
+        WorkSheetParser that only parses the cells of some columns
+
+        The other cells are returned as None after checking whether they hold a value, which is
+        all pandas needs them for: the sheet width and which trailing rows are empty. One row,
+        the header, can be kept whole.
+
+        With count_others the values of the skipped cells below the header are also counted per
+        row in row_others, and collected per column in other_columns, to count them the way
+        pandas would in the whole sheet (see _other_values).
+
+        Args:
+            columns (iterable): 1-based columns to parse
+            keep_row (int): 1-based row to parse whole, None for none
+            count_others (bool): Count the values of the skipped cells
+        """
+
+        def __init__(self, src, shared_strings, columns, keep_row=None, count_others=False, **kwargs):
+            super().__init__(src, shared_strings, **kwargs)
+            self.columns = set(columns)
+            self.letters = {get_column_letter(col) for col in columns}
+            self.max_column = max(columns)
+            self.keep_row = keep_row
+            self.count_others = count_others
+            self.width = 0
+            self.row_has_data = False
+            self.row_others = 0
+            self.other_columns = {}  # 1-based column -> _OtherColumn
+
+        def parse_row(self, row):
+            self.row_has_data = False
+            self.row_others = 0
+            return super().parse_row(row)
+
+        def parse_cell(self, element):
+            coordinate = element.get('r')
+            counted = self.count_others and self.row_counter > (self.keep_row or 0)
+            # Cells without a reference are positioned by counting, so they are always parsed
+            if not coordinate or self.row_counter == self.keep_row or coordinate.rstrip(_DIGITS) in self.letters:
+                cell = super().parse_cell(element)
+                value = _convert_cell(cell)
+                if value != "":
+                    self.row_has_data = True
+                    self.width = max(self.width, cell['column'])
+                    if counted and cell['column'] not in self.columns:
+                        self._count_other(cell['column'], value)
+                return cell
+
+            if counted:
+                column = column_index_from_string(coordinate.rstrip(_DIGITS))
+                other = self.other_columns.get(column)
+                if other is not None and other.kinds is None:
+                    value = self._object_cell_value(element)
+                else:
+                    value = _convert_cell(super().parse_cell(element))
+                if value != "":
+                    self.row_has_data = True
+                    self.width = max(self.width, column)
+                    self._count_other(column, value)
+                return None
+
+            # Once the row has data and the sheet is wider than the parsed columns, nothing to check
+            if (not self.row_has_data or self.width < self.max_column) and self._has_value(element):
+                self.row_has_data = True
+                self.width = max(self.width, column_index_from_string(coordinate.rstrip(_DIGITS)))
+            return None
+
+        def _object_cell_value(self, element):
+            """
+            Stand-in for the converted value of a skipped cell of an object column
+
+            Only whether the cell is empty or NaN matters there, so only strings are read: the
+            value is "", NaN, the string, or True for any other value.
+            """
+            data_type = element.get('t', 'n')
+            if data_type == 'inlineStr':
+                child = element.find(INLINE_STRING)
+                if child is None:
+                    return ""
+                # As Text.content: the plain text, then the text of the runs without phonetic runs
+                return "".join([child.findtext(f"{MAIN_NS}t") or ""] +
+                               [run.text or "" for run in child.iterfind(f"{MAIN_NS}r/{MAIN_NS}t")])
+
+            value = element.findtext(VALUE_TAG) or None
+            if value is None:
+                return ""
+            if data_type == 'e':
+                return np.nan
+            if data_type == 's':
+                return self.shared_strings[int(value)]
+            if data_type == 'str':
+                return value
+            return True
+
+        def _count_other(self, column, value):
+            if _is_blank(value):
+                return
+            self.row_others += 1
+            other = self.other_columns.get(column)
+            if other is None:
+                other = self.other_columns[column] = _OtherColumn()
+            other.add(self.row_counter - 1, value)
+
+        def _has_value(self, element):
+            data_type = element.get('t', 'n')
+            if data_type not in ('s', 'inlineStr'):
+                return bool(element.findtext(VALUE_TAG))
+            # Strings can still be empty
+            return _convert_cell(super().parse_cell(element)) != ""
+
+
+def _stream_sheet(ws, usecols=None, header=None, count_others=False):
+    """
+    Stream the converted cell rows of a read-only worksheet, collecting merged ranges on the way
+
+    With usecols only those 0-based columns are parsed and converted, in that order. The header
+    row is still kept whole, as pandas names the columns across the full sheet width. With
+    count_others the values of the other columns are counted for each row below the header,
+    see _other_values.
+
+    Returns:
+        tuple: (rows, merged range references, sheet width, full header row or None, values
+            outside usecols per row below the header or None)
+    """
+    parent = ws.parent
+    options = dict(data_only=parent.data_only,
+                   epoch=parent.epoch,
+                   date_formats=parent._date_formats,
+                   timedelta_formats=parent._timedelta_formats)
+    rows = []
+    row_others = []
+    last_row = 0
+    header_cells = None
+    positions = None
+    with ws._get_source() as src:
+        if usecols is None:
+            parser = WorkSheetParser(src, ws._shared_strings, **options)
+        else:
+            positions = {col + 1: j for j, col in enumerate(usecols)}
+            keep_row = None if header is None else header + 1
+            parser = _ColumnSheetParser(src, ws._shared_strings, positions, keep_row, count_others, **options)
+
+        for row_idx, cells in parser.parse():
+            # Rows missing from the XML are empty
+            while len(rows) < row_idx - 1:
+                rows.append([])
+                row_others.append(0)
+            if positions is None:
+                row = _convert_row(cells)
+                has_data = bool(row)
+            else:
+                cells = [cell for cell in cells if cell is not None]
+                if row_idx == parser.keep_row:
+                    header_cells = _convert_row(cells)
+                row = _convert_row(cells, positions)
+                has_data = parser.row_has_data
+                row_others.append(parser.row_others)
+            rows.append(row)
+            if has_data:
+                last_row = len(rows)
+
+    # Trim trailing rows that are empty across the whole sheet width
+    del rows[last_row:]
+
+    other_values = None
+    if positions is None:
+        width = max((len(row) for row in rows), default=0)
+    else:
+        width = parser.width
+        if count_others:
+            other_values = _other_values(row_others[:last_row], parser.other_columns, positions, width)
+            other_values = other_values[0 if header is None else header + 1:]
+
+    # <mergeCells> comes after <sheetData>, so it is only known once all rows are read
+    merged_refs = []
+    if parser.merged_cells is not None:
+        merged_refs = [merge_cell.ref for merge_cell in parser.merged_cells.mergeCell]
+    return rows, merged_refs, width, header_cells, other_values
+
+
+def _other_values(row_others, other_columns, positions, width):
+    """
+    Count the values of each row outside the parsed columns the way the whole frame would hold them
+
+    In the frame of the whole sheet after where(notnull, None), a cell counts as a value unless it
+    is None. Empty cells of an object column are None, but those of a float or datetime column,
+    including columns with no values at all, stay NaN and count too.
+
+    Args:
+        row_others (list): Non-empty skipped cells per sheet row, from _ColumnSheetParser
+        other_columns (dict): _OtherColumn of each skipped 1-based column with values
+        positions (dict): Parsed 1-based columns
+        width (int): Sheet width
+
+    Returns:
+        ndarray: Values outside the parsed columns per sheet row
+    """
+    counts = np.array(row_others, dtype=np.int64)
+    nan_columns = 0
+    for col in range(1, width + 1):
+        if col in positions:
+            continue
+        other = other_columns.get(col)
+        if other is None:
+            nan_columns += 1
+        elif other.kinds is not None and _keeps_nan(other.kinds):
+            # Every row counts this column, the rows with a value already did
+            nan_columns += 1
+            counts[other.rows] -= 1
+    return counts + nan_columns
+
+
+def _convert_cell(cell):
+    """Convert a raw parser cell the same way pandas' openpyxl reader does"""
+    value = cell['value']
+    if value is None:
+        return ""
+    if cell['data_type'] == 'e':
+        return np.nan
+    if cell['data_type'] == 'n':
+        # Whole-number floats become ints, as in pandas
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+
+def _convert_row(cells, positions=None):
+    """
+    Convert raw parser cells to a row of values
+
+    Args:
+        cells (list): Cells of one row from WorkSheetParser
+        positions (dict): Maps 1-based sheet columns to their index in the row, other cells are
+            skipped. Defaults to every column at its own position
+    """
+    if not cells:
+        return []
+
+    if positions is None:
+        row = [""] * cells[-1]['column']
+        for cell in cells:
+            row[cell['column'] - 1] = _convert_cell(cell)
+    else:
+        row = [""] * len(positions)
+        for cell in cells:
+            j = positions.get(cell['column'])
+            if j is not None:
+                row[j] = _convert_cell(cell)
+
+    # Trim trailing empty cells
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def _rows_to_frame(rows, header=None, width=None):
+    """Build the DataFrame pd.read_excel(..., header=header) would return for these streamed rows"""
+    if not rows:
+        return pd.DataFrame()
+
+    # Extend rows to the same width
+    if width is None:
+        width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+
+    return TextParser(rows, header=header, skip_blank_lines=False).read()
+
+
+def _column_names(header_cells, width):
+    """Column names pandas derives from a header row across a sheet of the given width"""
+    header_cells = header_cells + [""] * (width - len(header_cells))
+    return TextParser([header_cells], header=0).read().columns
+
+
+class WorkbookReader:
+    """
+    An open workbook whose sheets are read with one of the READERS backends
+
+    Every backend returns the same DataFrame as pd.read_excel(..., header=header) and the merged
+    ranges of a sheet, so the converters do not depend on the backend.
+
+    Args:
+        excel_file (str, bytes or file): Path to the Excel file, its content, or a binary file
+            object open for reading, e.g. an uploaded file
+        reader (str): One of READERS, defaults to "auto"
+        warn (callable): Called with a message when the requested backend is not installed
+        name (str): Name used for the outputs, defaults to the file name without its extension,
+            or "workbook" for content and file objects
+
+    Attributes:
+        path (Path): Path to the Excel file, None when it was given as content or a file object
+        name (str): Name used for the outputs
+    """
+
+    def __init__(self, excel_file, reader="auto", warn=print, name=None):
+        if isinstance(excel_file, (bytes, bytearray, memoryview)):
+            excel_file = io.BytesIO(excel_file)
+        self.excel_file = excel_file
+        self.path = Path(excel_file) if isinstance(excel_file, (str, os.PathLike)) else None
+        self.name = name or (self.path.stem if self.path is not None else "workbook")
+        self.reader = resolve_reader(reader, warn)
+        self._merged_refs = {}
+
+        if self.reader == "openpyxl":
+            self._workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True, keep_links=False)
+            self.sheet_names = self._workbook.sheetnames
+        else:
+            engine = "calamine" if self.reader == "calamine" else "openpyxl"
+            self._workbook = pd.ExcelFile(excel_file, engine=engine)
+            self.sheet_names = self._workbook.sheet_names
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def read_frame(self, sheet_name, header=None):
+        """Cell values of a sheet, as pd.read_excel(..., header=header) would return them"""
+        if self.reader == "openpyxl":
+            rows, self._merged_refs[sheet_name], _, _, _ = _stream_sheet(self._workbook[sheet_name])
+            return _rows_to_frame(rows, header)
+        return pd.read_excel(self._workbook, sheet_name=sheet_name, header=header)
+
+    def read_columns(self, sheet_name, usecols, header=None, count_others=False):
+        """
+        Load only some columns of a sheet, the other cells are skipped while reading
+
+        Columns keep the names pd.read_excel(..., header=header) gives them in the whole sheet.
+        Columns past the last non-empty column of the sheet are left out.
+
+        Args:
+            sheet_name (str): Sheet to read
+            usecols (list): 0-based column indices to load
+            header (int): Row holding the column names, None for none
+            count_others (bool): Also count the values of each row in the other columns, e.g. to
+                tell tag rows from data rows. They are counted as in the frame of the whole sheet
+                after where(notnull, None), where the empty cells of float columns stay NaN. The
+                pandas and calamine readers parse every cell anyway and count them in that frame
+
+        Returns:
+            tuple: (DataFrame, 0-based column index of each of its columns, values per row in the
+                other columns as an array, or None without count_others)
+        """
+        usecols = sorted(set(usecols))
+        if self.reader != "openpyxl":
+            if count_others:
+                frame = pd.read_excel(self._workbook, sheet_name=sheet_name, header=header)
+                present = [col for col in usecols if col < len(frame.columns)]
+                others = frame.iloc[:, [col for col in range(len(frame.columns)) if col not in present]]
+                # Converted per column, so NaT of datetime columns stays a value as in a mixed frame
+                others = others.where(pd.notnull(others), None).astype(object).to_numpy()
+                return frame.iloc[:, present], present, (others != None).sum(axis=1)  # noqa: E711
+            try:
+                frame = pd.read_excel(self._workbook, sheet_name=sheet_name, header=header, usecols=usecols)
+                return frame, usecols, None
+            except ParserError:
+                # pandas refuses columns past the sheet width, load all columns and select the valid ones
+                frame = pd.read_excel(self._workbook, sheet_name=sheet_name, header=header)
+                present = [col for col in usecols if col < len(frame.columns)]
+                return frame.iloc[:, present], present, None
+
+        rows, self._merged_refs[sheet_name], width, header_cells, other_values = _stream_sheet(
+            self._workbook[sheet_name], usecols, header, count_others)
+        present = [col for col in usecols if col < width]
+        frame = _rows_to_frame([row[:len(present)] for row in rows], header, len(present))
+        if header is not None and len(frame.columns):
+            frame.columns = _column_names(header_cells or [], width)[present]
+        return frame, present, other_values
+
+    def merged_cells(self, sheet_name):
+        """Merged ranges of a sheet as dicts with 1-based min_row, max_row, min_col and max_col"""
+        refs = self._merged_refs.get(sheet_name)
+        if refs is None:
+            refs = scan_merged_refs(self.excel_file, sheet_name)
+            self._merged_refs[sheet_name] = refs
+        return [merged_range(ref) for ref in refs]
+
+    def close(self):
+        self._workbook.close()
@@ -0,0 +1,315 @@
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+from json_stream import StreamWriter, compact_json, write_atomic
+
+# Bump when the index layout or the normalization changes
+INDEX_VERSION = 1
+
+# Record fields that are indexed, when present
+SEARCH_FIELDS = ("原名", "译名", "称呼者", "被称者", "原文", "译文")
+
+# Character n-gram sizes, unigrams so that one-character queries are index lookups too
+NGRAM_SIZES = (1, 2)
+
+# Alias groups the frontend uses for fuzzy name matching
+FUZZY_DICT_PATH = Path(__file__).parent.parent / "src" / "assets" / "FuzzySearchDict.json"
+
+# Japanese kanji folded to the simplified form used in the translations. More pairs are derived
+# from the names in FuzzySearchDict.json
+KANJI_FOLD = {
+    "愛": "爱", "絵": "绘", "東": "东", "雲": "云", "馬": "马", "鳳": "凤", "寧": "宁", "類": "类",
+    "暁": "晓", "遙": "遥", "沢": "泽", "鏡": "镜", "時": "时", "楽": "乐", "語": "语", "話": "话",
+    "読": "读", "書": "书", "聴": "听", "気": "气", "恵": "惠", "戦": "战", "関": "关",
+    "開": "开", "閉": "闭", "問": "问", "題": "题", "様": "样", "発": "发", "変": "变",
+}
+
+_WORD_SPLIT = re.compile(r"[\W_]+")
+
+
+def _is_ideograph(char):
+    return "一" <= char <= "鿿" or "㐀" <= char <= "䶿"
+
+
+def load_fuzzy_dict(path=FUZZY_DICT_PATH):
+    """
+    Read the alias groups from FuzzySearchDict.json
+
+    Returns:
+        list: One list of names per character, empty if the file does not exist
+    """
+    path = Path(path)
+    if not path.exists():
+        return []
+
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f).get("模糊搜索表", [])
+    return [[value for key, value in entry.items() if key.startswith("name_") and value]
+            for entry in entries]
+
+
+def build_kanji_fold(alias_groups):
+    """
+    Extend KANJI_FOLD with the kanji pairs of names whose Japanese and Chinese forms line up
+
+    "桐谷遙" / "桐谷遥" gives 遙 -> 遥. Pairs are only taken from names of equal length where both
+    characters are ideographs, so kana spelled out with kanji (みのり / 实乃里) are left alone.
+    """
+    fold = dict(KANJI_FOLD)
+    for names in alias_groups:
+        if len(names) < 2 or len(names[0]) != len(names[1]):
+            continue
+        for source, target in zip(names[0], names[1]):
+            if source != target and _is_ideograph(source) and _is_ideograph(target):
+                fold.setdefault(source, target)
+    return fold
+
+
+def normalize_text(text, kanji_fold=KANJI_FOLD):
+    """
+    Normalize text for indexing and querying
+
+    NFKC folds full-width ASCII and half-width katakana, then the text is case-folded, katakana
+    is mapped to hiragana and Japanese kanji are folded to their simplified form.
+    """
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    chars = []
+    for char in text:
+        code = ord(char)
+        if 0x30A1 <= code <= 0x30F6:
+            char = chr(code - 0x60)
+        chars.append(kanji_fold.get(char, char))
+    return "".join(chars)
+
+
+def char_ngrams(text, sizes=NGRAM_SIZES):
+    """Set of the character n-grams of a normalized string, whitespace excluded"""
+    grams = set()
+    for part in text.split():
+        for size in sizes:
+            for start in range(len(part) - size + 1):
+                grams.add(part[start:start + size])
+    return grams
+
+
+def word_tokens(text):
+    """The whole normalized value plus its words split on punctuation and whitespace"""
+    tokens = {text.strip()}
+    tokens.update(_WORD_SPLIT.split(text))
+    tokens.discard("")
+    return tokens
+
+
+class SearchIndexWriter(StreamWriter):
+    """
+    Build an inverted index of record ids while records stream past
+
+    Fed by the converters alongside the JSON output. The index is written as minified JSON on close:
+
+        {
+            "version": 1,
+            "ngramSizes": [1, 2],
+            "kanjiFold": {"遙": "遥", ...},
+            "indexes": {
+                "<array key>": {
+                    "fields": [...],       indexed fields present in the records
+                    "count": 123,          number of records
+                    "ngrams": {gram: [id, ...]},
+                    "tokens": {token: [id, ...]}
+                }
+            }
+        }
+
+    "ngrams" answers substring queries: a record contains the query only if it is in the
+    postings of every n-gram of the query, so the candidates need one check against the record.
+    "tokens" holds whole values, words and the FuzzySearchDict aliases of names found in a
+    record, for exact and romaji lookups. Posting lists are sorted record ids.
+
+    Args:
+        path (str): Index file path
+        fields (list): Fields to index, defaults to SEARCH_FIELDS
+        id_field (str): Record field holding the id
+        alias_groups (list): Alias groups, defaults to the ones in FuzzySearchDict.json
+    """
+
+    def __init__(self, path, fields=SEARCH_FIELDS, id_field="id", alias_groups=None):
+        self.path = Path(path)
+        self.fields = tuple(fields)
+        self.id_field = id_field
+        alias_groups = load_fuzzy_dict() if alias_groups is None else alias_groups
+        self.kanji_fold = build_kanji_fold(alias_groups)
+
+        # Each group's normalized names, matched against fields to attach the group's aliases.
+        # Romaji aliases such as "sk" are too short to look for inside other text
+        self.alias_groups = []
+        for names in alias_groups:
+            normalized = sorted({normalize_text(name, self.kanji_fold) for name in names})
+            self.alias_groups.append(([name for name in normalized if not name.isascii()], normalized))
+
+        self.arrays = 0
+        self.items = 0
+        self.indexes = {}
+        self._current = None
+
+    def open(self):
+        pass
+
+    def begin_array(self, key):
+        self.end_array()
+        self._current = {"fields": set(), "ngrams": {}, "tokens": {}}
+        self.indexes[key] = self._current
+        self.arrays += 1
+        self.items = 0
+
+    def write_item(self, item):
+        current = self._current
+        if current is None:
+            raise RuntimeError("write_item() called before begin_array()")
+
+        record_id = item.get(self.id_field, self.items)
+        grams = set()
+        tokens = set()
+        for field in self.fields:
+            value = item.get(field)
+            if value is None or value != value:  # Skip None and NaN
+                continue
+            current["fields"].add(field)
+            text = normalize_text(value, self.kanji_fold)
+            grams |= char_ngrams(text)
+            tokens |= word_tokens(text)
+
+            for names, aliases in self.alias_groups:
+                if any(name in text for name in names):
+                    tokens.update(aliases)
+
+        for gram in grams:
+            current["ngrams"].setdefault(gram, []).append(record_id)
+        for token in tokens:
+            current["tokens"].setdefault(token, []).append(record_id)
+        self.items += 1
+
+    def end_array(self):
+        if self._current is not None:
+            self._current["count"] = self.items
+            self._current = None
+
+    def to_dict(self):
+        self.end_array()
+        indexes = {}
+        for key, index in self.indexes.items():
+            indexes[key] = {
+                "fields": [field for field in self.fields if field in index["fields"]],
+                "count": index["count"],
+                "ngrams": {gram: sorted(ids) for gram, ids in sorted(index["ngrams"].items())},
+                "tokens": {token: sorted(ids) for token, ids in sorted(index["tokens"].items())},
+            }
+        return {
+            "version": INDEX_VERSION,
+            "ngramSizes": list(NGRAM_SIZES),
+            "kanjiFold": self.kanji_fold,
+            "indexes": indexes,
+        }
+
+    def close(self):
+        """Write the index file"""
+        write_atomic(self.path, compact_json(self.to_dict()))
+
+    def abort(self):
+        self._current = None
+        self.indexes = {}
+
+
+def index_path_for(output_path):
+    """'{stem}.index.json' next to an asset"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}.index.json")
+
+
+class SearchIndex:
+    """
+    Query side of an index written by SearchIndexWriter
+
+    Args:
+        index (dict): Parsed index file
+        key (str): Array key to query, defaults to the first one
+    """
+
+    def __init__(self, index, key=None):
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version {index.get('version')}, expected {INDEX_VERSION}")
+
+        self.kanji_fold = index["kanjiFold"]
+        self.ngram_sizes = tuple(index["ngramSizes"])
+        if key is None:
+            key = next(iter(index["indexes"]))
+        entry = index["indexes"][key]
+        self.fields = entry["fields"]
+        self.count = entry["count"]
+        self.ngrams = entry["ngrams"]
+        self.tokens = entry["tokens"]
+
+    @classmethod
+    def load(cls, path, key=None):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), key)
+
+    def normalize(self, text):
+        return normalize_text(text, self.kanji_fold)
+
+    def candidates(self, query):
+        """
+        Ids of the records that may contain the query as a substring
+
+        Queries of up to max(ngramSizes) characters are answered exactly, longer ones need
+        matches() to drop records that contain every n-gram but not the whole query.
+        """
+        text = self.normalize(query).strip()
+        if not text:
+            return set()
+
+        # Longest n-grams of each word, shorter words fall back to smaller n-grams
+        size = max(self.ngram_sizes)
+        grams = set()
+        for part in text.split():
+            grams |= char_ngrams(part, (min(size, len(part)),))
+
+        # Intersect from the shortest posting list
+        postings = sorted((self.ngrams.get(gram, []) for gram in grams), key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            if not result:
+                break
+            result.intersection_update(ids)
+        return result
+
+    def matches(self, record, query):
+        """Whether a record contains the normalized query in one of the indexed fields"""
+        text = self.normalize(query).strip()
+        for field in self.fields:
+            value = record.get(field)
+            if value is not None and value == value and text in self.normalize(value):
+                return True
+        return False
+
+    def search(self, query, records_by_id=None):
+        """
+        Ids of the records matching a query
+
+        Combines substring matches with exact token and FuzzySearchDict alias matches, so
+        "ichika" finds records mentioning 星乃一歌.
+
+        Args:
+            query (str): Search text
+            records_by_id (dict): Records by id, used to verify candidates of long queries
+
+        Returns:
+            list: Sorted record ids
+        """
+        result = self.candidates(query)
+        if records_by_id is not None and len(self.normalize(query).strip()) > max(self.ngram_sizes):
+            result = {record_id for record_id in result if self.matches(records_by_id[record_id], query)}
+
+        result.update(self.tokens.get(self.normalize(query).strip(), []))
+        return sorted(result)
@@ -0,0 +1,45 @@
+from readers import WorkbookReader
+
+
+class SheetGrid:
+    """
+    Cell values and merged ranges of a single worksheet, loaded from the workbook in one pass
+
+    Attributes:
+        title (str): Sheet name
+        frame (DataFrame): Cell values, identical to pd.read_excel(..., header=None)
+        merged_cells (list): Merged ranges as dicts with 1-based min_row, max_row, min_col and max_col
+    """
+
+    def __init__(self, title, frame, merged_cells):
+        self.title = title
+        self.frame = frame
+        self.merged_cells = merged_cells
+
+
+def load_sheet_grid(excel_file, sheet_name=None, reader="auto", warn=print):
+    """
+    Load the cell values and merged ranges of one worksheet
+
+    With the openpyxl reader both come from a single streaming pass over the sheet XML. The
+    other readers load the values through pandas and scan the merged ranges from the XML.
+
+    Args:
+        excel_file (str, bytes, file or WorkbookReader): Path to the Excel file, its content, or a
+            workbook that is already open
+        sheet_name (str): Sheet name to load, defaults to the first sheet
+        reader (str): Reader backend, see readers.READERS
+        warn (callable): Called with a message when the requested backend is not installed
+
+    Returns:
+        SheetGrid: The loaded sheet
+    """
+    if not isinstance(excel_file, WorkbookReader):
+        with WorkbookReader(excel_file, reader, warn) as workbook:
+            return load_sheet_grid(workbook, sheet_name)
+
+    workbook = excel_file
+    if sheet_name is None:
+        sheet_name = workbook.sheet_names[0]
+    frame = workbook.read_frame(sheet_name)
+    return SheetGrid(sheet_name, frame, workbook.merged_cells(sheet_name))
@@ -0,0 +1,205 @@
+import argparse
+import random
+from pathlib import Path
+
+import openpyxl
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+
+TERM_SHEET = "25用专业名词表"
+NAMEREF_SHEET = "人称表_2"
+
+# Unit names, recognised as Tag_2 rows by nameref_to_json and used as D-column tags
+UNITS = ["Leo/need", "MORE MORE JUMP", "Vivid BAD SQUAD", "Wonderlands×Showtime", "25时", "VIRTUAL SINGER"]
+
+CHARACTERS = ["一歌", "咲希", "穂波", "志歩", "みのり", "遥", "愛莉", "雫", "こはね", "杏", "彰人", "冬弥",
+              "司", "えむ", "寧々", "類", "奏", "まふゆ", "絵名", "瑞希", "ミク", "リン", "レン", "ルカ",
+              "MEIKO", "KAITO"]
+
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+KANJI = "星乃天馬日野森望月花里桐谷桃井小豆沢白石東雲青柳鳳神代宵崎朝比奈暁山音歌曲夢想世界舞台"
+HANZI = "星乃天马日野森望月花里桐谷桃井小豆泽白石东云青柳凤神代宵崎朝比奈晓山音歌曲梦想世界舞台"
+HONORIFICS = [("さん", "桑"), ("ちゃん", "酱"), ("くん", "君"), ("先輩", "前辈"), ("", "")]
+
+# Working columns right of the 专有名词 columns, used by the translators and not converted.
+# The first holds a count on data rows, the others sparse review marks
+WORKING_COLUMNS = 20
+REVIEW_MARKS = ["✓", "待校对", "已确认", "?"]
+
+
+def _term(rng):
+    """A made-up term and its translation, sharing kanji where the original has them"""
+    length = rng.randint(2, 8)
+    original = []
+    translation = []
+    for _ in range(length):
+        if rng.random() < 0.5:
+            i = rng.randrange(len(KANJI))
+            original.append(KANJI[i])
+            translation.append(HANZI[i])
+        else:
+            original.append(rng.choice(KATAKANA))
+            translation.append(rng.choice(HANZI))
+    return "".join(original), "".join(translation)
+
+
+def term_sheet_names(count):
+    """Names of the 专有名词 sheets of a workbook with several of them, the first is TERM_SHEET"""
+    return [TERM_SHEET] + [f"{TERM_SHEET}_{i}" for i in range(2, count + 1)]
+
+
+def _review_marks(rng, working_columns, chance):
+    """Values of the review mark columns, each set with the given chance"""
+    return [rng.choice(REVIEW_MARKS) if rng.random() < chance else None for _ in range(working_columns - 1)]
+
+
+def write_term_sheet(wb, rows, seed=0, sheet_name=TERM_SHEET, working_columns=WORKING_COLUMNS):
+    """
+    Add a 专有名词 sheet shaped like the real one
+
+    Row 1 is a title and row 2 the field names (header_row=1). Data rows fill columns A-C.
+    Tag header rows have a unit name in column D, some blocks are closed by an "END" marker in
+    column D, and a few rows are blank. Columns from E on are working columns with a field name:
+    a count on every data row and sparse review marks, which some tag rows have too.
+
+    Args:
+        wb (Workbook): Write-only workbook
+        rows (int): Number of rows below the field names
+        seed (int): Random seed
+        working_columns (int): Number of working columns
+    """
+    rng = random.Random(seed)
+    ws = wb.create_sheet(sheet_name)
+    ws.append([sheet_name])
+    ws.append(["原名", "译名", "备注", "分类"] + [f"工作{i + 1}" for i in range(working_columns)])
+
+    written = 0
+    while written < rows:
+        roll = rng.random()
+        if roll < 0.02:
+            marks = _review_marks(rng, working_columns, 0.05) if working_columns else []
+            ws.append([None, None, None, rng.choice(UNITS), None] + marks)
+        elif roll < 0.025:
+            ws.append([None, None, None, "END"])
+        elif roll < 0.035:
+            ws.append([])
+        else:
+            original, translation = _term(rng)
+            note = f"{rng.choice(CHARACTERS)}相关" if rng.random() < 0.3 else None
+            row = [original, translation, note]
+            if working_columns:
+                row += [None, len(original)] + _review_marks(rng, working_columns, 0.1)
+            ws.append(row)
+        written += 1
+    return ws
+
+
+def write_nameref_sheet(wb, rows, callers=len(CHARACTERS), seed=0, sheet_name=NAMEREF_SHEET):
+    """
+    Add a 人称表 grid shaped like the real one
+
+    The first row names the callers, each in the first column of a (原文, 译文) pair, with a
+    header-only unit column (Tag_1) before each unit's callers. Column A holds unit rows (Tag_2)
+    and callee names; a callee's row through its own caller column is a merged self-reference
+    cell. Some callees continue on a following row with column A left empty, and some pairs are
+    blank.
+
+    Args:
+        wb (Workbook): Write-only workbook
+        rows (int): Number of grid rows below the caller row
+        callers (int): Number of caller columns
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    ws = wb.create_sheet(sheet_name)
+    names = [CHARACTERS[i % len(CHARACTERS)] + ("" if i < len(CHARACTERS) else str(i // len(CHARACTERS)))
+             for i in range(callers)]
+
+    # Caller row: a unit column before every group of four callers
+    header = [None]
+    caller_cols = []
+    for i, name in enumerate(names):
+        if i % 4 == 0:
+            header.append(UNITS[(i // 4) % len(UNITS)])
+        caller_cols.append(len(header))
+        header.extend([name, None])
+    ws.append(header)
+    width = len(header)
+
+    written = 0
+    callee = 0
+    while written < rows:
+        row_number = written + 2
+        if written % 40 == 0:
+            ws.append([UNITS[(written // 40) % len(UNITS)]])
+            written += 1
+            continue
+
+        callee_index = callee % callers
+        callee += 1
+        continuation = rng.random() < 0.1
+        row = [None if continuation else names[callee_index]] + [None] * (width - 1)
+        for caller_index, col in enumerate(caller_cols):
+            if caller_index == callee_index:
+                # Self-reference: one value across the merged (原文, 译文) pair
+                row[col] = "自分" if rng.random() < 0.5 else "私"
+                ws.merged_cells.add(CellRange(f"{get_column_letter(col + 1)}{row_number}:"
+                                              f"{get_column_letter(col + 2)}{row_number}"))
+            elif rng.random() < 0.9:
+                honorific, translated = rng.choice(HONORIFICS)
+                row[col] = names[callee_index] + honorific
+                row[col + 1] = names[callee_index] + translated
+        ws.append(row)
+        written += 1
+    return ws
+
+
+def generate_workbook(path, term_rows=0, nameref_rows=0, callers=len(CHARACTERS), seed=0, term_sheets=1,
+                      working_columns=WORKING_COLUMNS):
+    """
+    Write a synthetic workbook with 专有名词 sheets and/or a 人称表 grid
+
+    Args:
+        path (str): Output .xlsx path
+        term_rows (int): Rows of each 专有名词 sheet, 0 to leave them out
+        nameref_rows (int): Rows of the 人称表 grid, 0 to leave it out
+        callers (int): Caller columns of the 人称表 grid
+        seed (int): Random seed, the same arguments always produce the same cell values
+        term_sheets (int): Number of 专有名词 sheets, named by term_sheet_names, each with its own values
+        working_columns (int): Working columns of each 专有名词 sheet
+
+    Returns:
+        Path: The workbook path
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    wb = openpyxl.Workbook(write_only=True)
+    if term_rows:
+        for i, sheet_name in enumerate(term_sheet_names(term_sheets)):
+            write_term_sheet(wb, term_rows, seed + i, sheet_name, working_columns)
+    if nameref_rows:
+        write_nameref_sheet(wb, nameref_rows, callers, seed)
+    wb.save(path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic workbook shaped like PJS翻译资料.xlsx")
+    parser.add_argument("output", help="Output .xlsx path")
+    parser.add_argument("--term-rows", type=int, default=1000, help="Rows of each 专有名词 sheet")
+    parser.add_argument("--term-sheets", type=int, default=1, help="Number of 专有名词 sheets")
+    parser.add_argument("--nameref-rows", type=int, default=1000, help="Rows of the 人称表 grid")
+    parser.add_argument("--callers", type=int, default=len(CHARACTERS), help="Caller columns of the 人称表 grid")
+    parser.add_argument("--working-columns", type=int, default=WORKING_COLUMNS,
+                        help="Working columns of each 专有名词 sheet")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args(argv)
+
+    path = generate_workbook(args.output, args.term_rows, args.nameref_rows, args.callers, args.seed,
+                             args.term_sheets, args.working_columns)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
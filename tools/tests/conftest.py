@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The tools are scripts importing each other by module name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from instrumentation import Metrics  # noqa: E402
+from synth_workbook import generate_workbook  # noqa: E402
+
+
+@pytest.fixture
+def metrics():
+    return Metrics(quiet=True)
+
+
+@pytest.fixture(scope="session")
+def term_workbook(tmp_path_factory):
+    """Synthetic workbook with one 专有名词 sheet"""
+    return generate_workbook(tmp_path_factory.mktemp("synth") / "terms.xlsx", term_rows=300)
+
+
+@pytest.fixture(scope="session")
+def multi_sheet_workbook(tmp_path_factory):
+    """Synthetic workbook with three 专有名词 sheets"""
+    return generate_workbook(tmp_path_factory.mktemp("synth") / "multi.xlsx", term_rows=200, term_sheets=3)
+
+
+@pytest.fixture(scope="session")
+def nameref_workbook(tmp_path_factory):
+    """Synthetic workbook with a 人称表 grid"""
+    return generate_workbook(tmp_path_factory.mktemp("synth") / "nameref.xlsx", nameref_rows=40, callers=6)
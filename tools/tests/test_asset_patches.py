@@ -0,0 +1,62 @@
+import json
+
+from asset_patches import PatchWriter, apply_patch, read_patch_manifest
+
+
+def write_version(patch_dir, data):
+    with PatchWriter(patch_dir, "asset") as writer:
+        for key, records in data.items():
+            writer.begin_array(key)
+            for record in records:
+                writer.write_item(record)
+    return writer
+
+
+def read_patch(writer):
+    with open(writer.written, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+V1 = {
+    "terms": [{"原名": f"term{i}", "译名": f"译{i}", "id": i} for i in range(6)],
+    "units": [{"名称": "Leo/need", "id": 0}],
+}
+
+
+def test_first_run_records_the_base(tmp_path):
+    writer = write_version(tmp_path, V1)
+    assert writer.version == 1 and writer.written is None
+    assert read_patch_manifest(tmp_path / "asset")["patches"] == []
+
+
+def test_apply_patch_gives_the_new_version(tmp_path):
+    terms = [dict(record) for record in V1["terms"]]
+    terms[2]["译名"] = "改"
+    del terms[4]
+    terms.insert(0, {"原名": "new", "译名": "新", "id": 6})
+    v2 = {"terms": terms, "colors": [{"名称": "ミク", "应援色": "#33CCBB", "id": 0}]}
+
+    write_version(tmp_path, V1)
+    writer = write_version(tmp_path, v2)
+    patch = read_patch(writer)
+
+    assert writer.version == 2
+    assert patch["arrays"]["terms"]["modified"] == [terms[3]]
+    assert patch["arrays"]["terms"]["removed"] == [4]
+    assert patch["removedArrays"] == ["units"]
+    assert apply_patch(V1, patch) == v2
+
+
+def test_unchanged_asset_writes_no_patch(tmp_path):
+    write_version(tmp_path, V1)
+    writer = write_version(tmp_path, V1)
+    assert writer.written is None and writer.version == 1
+
+
+def test_duplicate_ids_warn(tmp_path):
+    messages = []
+    with PatchWriter(tmp_path, "asset", warn=messages.append) as writer:
+        writer.begin_array("terms")
+        writer.write_item({"id": 0})
+        writer.write_item({"id": 0})
+    assert len(messages) == 1
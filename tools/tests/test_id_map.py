@@ -0,0 +1,77 @@
+import json
+import shutil
+
+import openpyxl
+import pytest
+
+from asset_patches import read_patch_manifest
+from id_map import IdMap
+from synth_workbook import TERM_SHEET
+from xls2json import excel_to_json
+
+KEY_FIELDS = ["原名", "Tag_0"]
+
+
+def convert(workbook, tmp_path, metrics):
+    excel_to_json(workbook, tmp_path / "out", sheets=[TERM_SHEET], header_row=1, columns=["A", "B", "C"],
+                  tag_column=["D"], output_filename="terms.json", patch_dir=tmp_path / "patches",
+                  id_map=tmp_path / "terms.ids.json", key_fields=KEY_FIELDS, metrics=metrics)
+    with open(tmp_path / "out" / "terms.json", 'r', encoding='utf-8') as f:
+        return json.load(f)[TERM_SHEET]
+
+
+def test_edited_translation_keeps_its_id(term_workbook, tmp_path, metrics):
+    workbook = tmp_path / "terms.xlsx"
+    shutil.copyfile(term_workbook, workbook)
+    (tmp_path / "out").mkdir()
+    before = convert(workbook, tmp_path, metrics)
+
+    # Edit the 译名 of the first term whose 原名 is unique
+    originals = [record["原名"] for record in before]
+    edited = next(record for record in before if originals.count(record["原名"]) == 1)
+    wb = openpyxl.load_workbook(workbook)
+    ws = wb[TERM_SHEET]
+    row = next(row for row in ws.iter_rows(min_row=3) if row[0].value == edited["原名"])
+    row[1].value = "改过的译名"
+    wb.save(workbook)
+
+    after = convert(workbook, tmp_path, metrics)
+    assert [record["id"] for record in after] == [record["id"] for record in before]
+
+    patch_path = tmp_path / "patches" / "terms"
+    manifest = read_patch_manifest(patch_path)
+    with open(patch_path / manifest["patches"][-1]["file"], 'r', encoding='utf-8') as f:
+        patch = json.load(f)
+    assert patch["arrays"] == {TERM_SHEET: {"modified": [{**edited, "译名": "改过的译名"}]}}
+
+
+def test_key_fields_are_required(tmp_path):
+    with pytest.raises(ValueError):
+        IdMap(tmp_path / "terms.ids.json", None)
+
+
+def test_repeated_keys_keep_their_order(tmp_path):
+    records = [{"原名": "同名", "译名": "甲"}, {"原名": "同名", "译名": "乙"}, {"原名": "其他", "译名": "丙"}]
+    id_map = IdMap(tmp_path / "ids.json", ["原名"])
+    ids = id_map.array("terms")
+    assert [ids.assign(record) for record in records] == [0, 1, 2]
+    assert ids.duplicates == 1
+    id_map.save()
+
+    # A new record in front of them does not shift the ids of the others
+    ids = IdMap(tmp_path / "ids.json", ["原名"]).array("terms")
+    assert [ids.assign(record) for record in [{"原名": "新"}] + records] == [3, 0, 1, 2]
+
+
+def test_rejects_colliding_ids(tmp_path):
+    path = tmp_path / "ids.json"
+    path.write_text(json.dumps({"version": 1, "keyFields": ["原名"],
+                                "arrays": {"terms": {"nextId": 2, "ids": {"a": 0, "b": 0}}}}), encoding='utf-8')
+    with pytest.raises(ValueError):
+        IdMap(path, ["原名"])
+
+
+def test_rejects_other_key_fields(tmp_path):
+    IdMap(tmp_path / "ids.json", ["原名"]).save()
+    with pytest.raises(ValueError):
+        IdMap(tmp_path / "ids.json", ["原名", "Tag_0"])
@@ -0,0 +1,34 @@
+from json_lines import JsonLinesReader, JsonLinesWriter, offsets_path_for
+
+RECORDS = [{"原名": "ミク", "译名": "初音未来", "id": 3},
+           {"原名": "リン", "译名": None, "id": 1},
+           {"原名": "レン", "译名": "镜音连", "Tag_0": "VIRTUAL SINGER", "id": 2}]
+
+
+def test_reader_finds_written_records(tmp_path):
+    with JsonLinesWriter(tmp_path, "asset") as writer:
+        writer.begin_array("terms")
+        for record in RECORDS:
+            writer.write_item(record)
+        writer.begin_array("empty")
+
+    path = tmp_path / "asset_terms.jsonl"
+    assert writer.written == [path, tmp_path / "asset_empty.jsonl"]
+    assert offsets_path_for(path).exists()
+    with JsonLinesReader(path) as rows:
+        assert len(rows) == len(RECORDS)
+        for position, record in enumerate(RECORDS):
+            assert rows.get(record["id"]) == record
+            assert rows.read_at(position) == record
+        assert rows.get(99) is None
+    with JsonLinesReader(tmp_path / "asset_empty.jsonl") as rows:
+        assert len(rows) == 0
+
+
+def test_abort_keeps_no_partial_file(tmp_path):
+    writer = JsonLinesWriter(tmp_path, "asset")
+    writer.open()
+    writer.begin_array("terms")
+    writer.write_item(RECORDS[0])
+    writer.abort()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+from kv_shards import KvShardWriter, read_shard_manifest
+
+ITEMS = [{"原名": f"term{i}", "译名": "译" * (i % 7), "id": i} for i in range(200)]
+
+
+def test_chunks_hold_every_item(tmp_path):
+    with KvShardWriter(tmp_path, kv_keys={"专有名词表": "terms"}, max_chunk_bytes=1000) as writer:
+        writer.begin_array("专有名词表")
+        for item in ITEMS:
+            writer.write_item(item)
+
+    manifest = read_shard_manifest(tmp_path / "terms")
+    assert manifest["key"] == "terms"
+    assert manifest["items"] == len(ITEMS)
+    assert manifest["meta"]["chunksCount"] == len(manifest["chunks"]) > 1
+    # originalSize is the size of JSON.stringify of the whole array
+    whole = json.dumps({"专有名词表": ITEMS}, ensure_ascii=False, separators=(',', ':'))
+    assert manifest["meta"]["originalSize"] == len(whole.encode('utf-8'))
+
+    items = []
+    for i, chunk in enumerate(manifest["chunks"]):
+        path = tmp_path / "terms" / chunk["file"]
+        value = json.loads(path.read_text(encoding='utf-8'))
+        assert value["_chunkIndex"] == i and value["_totalChunks"] == len(manifest["chunks"])
+        assert chunk["bytes"] == path.stat().st_size
+        assert value["专有名词表"] == ITEMS[chunk["items"][0]:chunk["items"][1]]
+        items += value["专有名词表"]
+    assert items == ITEMS
+
+
+def test_record_source(tmp_path):
+    source = tmp_path / "terms.json"
+    source.write_text(json.dumps({"专有名词表": ITEMS}, ensure_ascii=False), encoding='utf-8')
+    with KvShardWriter(tmp_path / "shards", kv_keys={"专有名词表": "terms"}) as writer:
+        writer.begin_array("专有名词表")
+        writer.write_item(ITEMS[0])
+    writer.record_source(source)
+
+    manifest = read_shard_manifest(tmp_path / "shards" / "terms")
+    assert manifest["source"] == {"file": "terms.json", "sha256": hashlib.sha256(source.read_bytes()).hexdigest()}
+
+
+def test_oversized_item_warns(tmp_path):
+    messages = []
+    with KvShardWriter(tmp_path, max_chunk_bytes=10, warn=messages.append) as writer:
+        writer.begin_array("terms")
+        writer.write_item(ITEMS[0])
+    assert len(messages) == 1
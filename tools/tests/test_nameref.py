@@ -0,0 +1,10 @@
+from PersonalSheetParser import nameref_records
+from synth_workbook import NAMEREF_SHEET
+
+
+def test_readers_match(nameref_workbook, metrics):
+    entries = {reader: nameref_records(nameref_workbook, NAMEREF_SHEET, reader=reader, metrics=metrics)
+               for reader in ("openpyxl", "pandas")}
+    assert entries["openpyxl"] == entries["pandas"]
+    assert entries["openpyxl"]
+    assert [entry["id"] for entry in entries["openpyxl"]] == list(range(676, 676 + len(entries["openpyxl"])))
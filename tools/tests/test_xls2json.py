@@ -0,0 +1,113 @@
+import json
+from pathlib import Path
+
+import openpyxl
+import pytest
+
+from readers import WorkbookReader
+from synth_workbook import TERM_SHEET, generate_workbook, term_sheet_names
+from xls2json import excel_to_json, table_records
+
+TABLE_OPTIONS = {"header_row": 1, "columns": ["A", "B", "C"], "tag_column": ["D"]}
+
+# Output of the original iterrows loop of excel_to_json for golden_workbook with TABLE_OPTIONS
+BASELINE_OUTPUT = Path(__file__).parent / "data" / "terms_baseline.json"
+
+
+@pytest.fixture(scope="module")
+def golden_workbook(tmp_path_factory):
+    """Small synthetic 专有名词 sheet with tag rows, END markers, a blank row and a tag row with a working value"""
+    return generate_workbook(tmp_path_factory.mktemp("golden") / "terms.xlsx", term_rows=100, seed=41)
+
+
+@pytest.fixture
+def working_columns_workbook(tmp_path):
+    """A tag row that also has values in unused working columns is not a tag row"""
+    path = tmp_path / "working_columns.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "S"
+    ws.append(["Title"])
+    ws.append(["原名", "译名", "备注", "Tag", "work1", "work2", "work3"])
+    ws.append([None, None, None, "UNIT_A"])
+    ws.append(["a", "A", "note", None, None, None, 1])
+    ws.append([None, None, None, "UNIT_B", "x", "y"])
+    ws.append(["b", "B"])
+    wb.save(path)
+    return path
+
+
+def convert(workbook, output_dir, metrics, **options):
+    """Consolidated JSON of a conversion, as written"""
+    output_dir.mkdir(exist_ok=True)
+    excel_to_json(workbook, output_dir, output_filename="out.json", metrics=metrics, **options)
+    return (output_dir / "out.json").read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize("reader", ["openpyxl", "pandas"])
+@pytest.mark.parametrize("engine", ["vectorized", "iterrows"])
+def test_matches_baseline_output(golden_workbook, tmp_path, metrics, engine, reader):
+    output = convert(golden_workbook, tmp_path, metrics, engine=engine, reader=reader, sheets=[TERM_SHEET],
+                     **TABLE_OPTIONS)
+    assert output == BASELINE_OUTPUT.read_text(encoding='utf-8')
+
+
+def test_engines_match(term_workbook, tmp_path, metrics):
+    vectorized = convert(term_workbook, tmp_path / "vectorized", metrics, engine="vectorized", **TABLE_OPTIONS)
+    iterrows = convert(term_workbook, tmp_path / "iterrows", metrics, engine="iterrows", **TABLE_OPTIONS)
+    assert vectorized == iterrows
+    records = json.loads(vectorized)[TERM_SHEET]
+    assert any("Tag_0" in record for record in records)
+
+
+def test_missing_sheet_writes_nothing(term_workbook, tmp_path, metrics):
+    assert excel_to_json(term_workbook, tmp_path, sheets=["nope"], metrics=metrics) == []
+    assert excel_to_json(term_workbook, tmp_path, sheets=[TERM_SHEET], output_filename="out.json",
+                         metrics=metrics, **TABLE_OPTIONS) == [tmp_path / "out.json"]
+
+
+@pytest.mark.parametrize("options", [TABLE_OPTIONS, {"header_row": 1}], ids=["letters", "all columns"])
+def test_readers_match(term_workbook, tmp_path, metrics, options):
+    outputs = {reader: convert(term_workbook, tmp_path / reader, metrics, reader=reader, **options)
+               for reader in ("openpyxl", "pandas")}
+    assert outputs["openpyxl"] == outputs["pandas"]
+
+
+def test_records_from_content(term_workbook, tmp_path, metrics):
+    written = json.loads(convert(term_workbook, tmp_path, metrics, **TABLE_OPTIONS))
+    assert table_records(term_workbook.read_bytes(), metrics=metrics, **TABLE_OPTIONS) == written
+
+
+@pytest.mark.parametrize("reader", ["openpyxl", "pandas"])
+def test_parallel_matches_serial(multi_sheet_workbook, tmp_path, metrics, reader):
+    options = dict(TABLE_OPTIONS, sheets=term_sheet_names(3), reader=reader, minify=True)
+    serial = convert(multi_sheet_workbook, tmp_path / "serial", metrics, **options)
+    parallel = convert(multi_sheet_workbook, tmp_path / "parallel", metrics, max_workers=3, **options)
+    assert parallel == serial
+    assert list(json.loads(parallel)) == term_sheet_names(3)
+
+
+def test_parallel_stable_ids(multi_sheet_workbook, tmp_path, metrics):
+    outputs = []
+    for max_workers in (1, 3):
+        run_dir = tmp_path / f"workers_{max_workers}"
+        outputs.append(convert(multi_sheet_workbook, run_dir, metrics, sheets=term_sheet_names(3),
+                               max_workers=max_workers, id_map=run_dir / "ids.json", key_fields=["原名", "Tag_0"],
+                               **TABLE_OPTIONS))
+    assert outputs[0] == outputs[1]
+
+
+@pytest.mark.parametrize("reader", ["openpyxl", "pandas"])
+def test_tag_rows_count_unused_columns(working_columns_workbook, reader, metrics):
+    records = table_records(working_columns_workbook, reader=reader, metrics=metrics, **TABLE_OPTIONS)
+    assert [record["Tag_0"] for record in records["S"]] == ["UNIT_A", "UNIT_A"]
+
+
+@pytest.mark.parametrize("reader", ["openpyxl", "pandas"])
+def test_read_columns_counts_others(working_columns_workbook, reader):
+    with WorkbookReader(working_columns_workbook, reader) as workbook:
+        frame, present, other_values = workbook.read_columns("S", [0, 1, 2, 3], header=1, count_others=True)
+        assert present == [0, 1, 2, 3] and len(frame) == 4
+        # The empty cells of the numeric work3 column stay NaN and count on every row
+        assert other_values.tolist() == [1, 1, 3, 1]
+        assert workbook.read_columns("S", [0, 1, 2, 3], header=1)[2] is None
@@ -0,0 +1,201 @@
+import argparse
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+from batch_convert import (DEFAULT_MANIFEST, add_output_arguments, apply_output_overrides, convert_asset,
+                           load_manifest, output_files_for)
+from build_cache import BuildCache, job_fingerprint, restore_outputs, sheet_fingerprints, tools_hash
+from instrumentation import Metrics
+from readers import WorkbookReader
+
+# Seconds the workbook must stay unchanged before it is read, Excel saves in several steps
+DEFAULT_DEBOUNCE = 0.3
+
+# Seconds between checks of the workbook's modification time
+DEFAULT_INTERVAL = 0.1
+
+
+def is_lock_file(path):
+    """Office lock files, '~$name.xlsx', exist while a workbook is open and are not workbooks"""
+    return Path(path).name.startswith("~$")
+
+
+def file_state(path):
+    """Modification time and size of a file, or None while it does not exist (e.g. mid-save)"""
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class AssetWatcher:
+    """
+    Reconvert the assets of a manifest as soon as their workbook is saved
+
+    Only the workbook files themselves are polled, so Office lock files and the temporary files
+    Excel writes while saving never trigger a conversion. Once a workbook has stopped changing
+    for the debounce time, its sheets are fingerprinted and only the assets whose sheet content
+    changed are converted, all of them from one open workbook. The workbook is not held open
+    between saves, as an open handle would stop Excel from saving it on Windows. The converters
+    move every output file into place with a rename, so readers never see a partial asset.
+
+    With a build cache the watcher and batch_convert share their results: unchanged assets are
+    restored from the cache on start, and every conversion is stored in it.
+
+    Args:
+        jobs (list): Jobs from load_manifest
+        cache (BuildCache): Build cache, or None
+        debounce (float): Seconds a workbook must stay unchanged before it is converted
+        interval (float): Seconds between polls
+        quiet (bool): Only print warnings and one line per update
+    """
+
+    def __init__(self, jobs, cache=None, debounce=DEFAULT_DEBOUNCE, interval=DEFAULT_INTERVAL, quiet=False):
+        self.cache = cache
+        self.debounce = debounce
+        self.interval = interval
+        self.quiet = quiet
+        self.code_hash = tools_hash() if cache is not None else None
+
+        self.jobs_by_workbook = {}
+        for job in jobs:
+            if is_lock_file(job["workbook"]):
+                print(f"Warning: Not watching Office lock file {job['workbook']} of '{job['name']}'")
+                continue
+            self.jobs_by_workbook.setdefault(job["workbook"], []).append(job)
+
+        self.states = {}  # Workbook -> file state last seen
+        self.changed_at = {}  # Workbook -> time its state last changed, until it is converted
+        self.unreadable = {}  # Workbook -> file state that could not be read, to warn once per state
+        self.sheet_hashes = {}  # Asset name -> fingerprint of the sheet it was last converted from
+
+    def sync(self, workbook):
+        """
+        Bring the assets of a workbook up to date with its current content
+
+        Returns:
+            list: Names of the assets that were converted or restored
+        """
+        jobs = self.jobs_by_workbook[workbook]
+        hashes = sheet_fingerprints(workbook, sorted({job["sheet"] for job in jobs}))
+
+        changed = []
+        for job in jobs:
+            sheet_hash = hashes.get(job["sheet"])
+            if sheet_hash is None:
+                print(f"Warning: Sheet '{job['sheet']}' of '{job['name']}' not found in {workbook}")
+            elif sheet_hash != self.sheet_hashes.get(job["name"]):
+                changed.append((job, sheet_hash))
+        if not changed:
+            return []
+
+        updated = []
+        pending = []
+        for job, sheet_hash in changed:
+            fingerprint = None
+            if self.cache is not None:
+                fingerprint = job_fingerprint(job, sheet_hash, self.code_hash)
+                cached_files = self.cache.lookup(job["name"], fingerprint)
+                if cached_files is not None:
+                    restore_outputs(cached_files)
+                    self.sheet_hashes[job["name"]] = sheet_hash
+                    updated.append(job["name"])
+                    continue
+            pending.append((job, sheet_hash, fingerprint))
+
+        # One open workbook per reader backend serves every changed sheet
+        for reader in sorted({job["reader"] for job, _, _ in pending}):
+            with WorkbookReader(workbook, reader) as excel:
+                for job, sheet_hash, fingerprint in pending:
+                    if job["reader"] != reader:
+                        continue
+                    try:
+                        convert_asset(job, Metrics(quiet=self.quiet), workbook=excel)
+                    except Exception as e:
+                        print(f"  FAILED  {job['name']}: {type(e).__name__}: {e}")
+                        if self.cache is not None:
+                            self.cache.remove(job["name"])
+                        continue
+                    if self.cache is not None:
+                        self.cache.store(job, fingerprint, output_files_for(job))
+                    self.sheet_hashes[job["name"]] = sheet_hash
+                    updated.append(job["name"])
+
+        if self.cache is not None:
+            self.cache.save()
+        return updated
+
+    def poll(self):
+        """Check every workbook once, converting the ones that have settled after a change"""
+        now = time.monotonic()
+        for workbook in self.jobs_by_workbook:
+            state = file_state(workbook)
+            if state != self.states.get(workbook):
+                self.states[workbook] = state
+                self.changed_at[workbook] = now
+                continue
+
+            changed_at = self.changed_at.get(workbook)
+            if changed_at is None or state is None or now - changed_at < self.debounce:
+                continue
+
+            start = time.perf_counter()
+            try:
+                updated = self.sync(workbook)
+            except (zipfile.BadZipFile, KeyError, OSError) as e:
+                # Still being written, or locked by the application saving it
+                if self.unreadable.get(workbook) != state:
+                    print(f"Warning: Could not read {workbook} yet ({type(e).__name__}: {e}), retrying")
+                    self.unreadable[workbook] = state
+                self.changed_at[workbook] = now
+                continue
+            del self.changed_at[workbook]
+            self.unreadable.pop(workbook, None)
+
+            if updated:
+                elapsed = time.perf_counter() - start
+                since_save = time.time() - state[0] / 1e9
+                print(f"[{time.strftime('%H:%M:%S')}] Updated {', '.join(updated)} in {elapsed:.2f}s "
+                      f"({since_save:.2f}s after the save)")
+
+    def run(self):
+        """Convert what is out of date, then watch until interrupted"""
+        for workbook in self.jobs_by_workbook:
+            self.states[workbook] = file_state(workbook)
+            updated = self.sync(workbook)
+            if updated:
+                print(f"Brought {', '.join(updated)} up to date")
+
+        print(f"Watching {', '.join(self.jobs_by_workbook)} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(self.interval)
+                self.poll()
+        except KeyboardInterrupt:
+            print("Stopped watching")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconvert the manifest's assets whenever their workbook is saved")
+    parser.add_argument("assets", nargs="*", help="Asset names to watch, defaults to all assets")
+    parser.add_argument("-m", "--manifest", default=str(DEFAULT_MANIFEST), help="Path to the asset manifest")
+    add_output_arguments(parser)
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help="Seconds the workbook must stay unchanged before converting")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between polls")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print warnings and one line per update")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use or update the build cache")
+    parser.add_argument("--cache-dir", default=None, help="Build cache directory, defaults to tools/.build_cache")
+    args = parser.parse_args(argv)
+
+    jobs = apply_output_overrides(load_manifest(args.manifest, args.assets), args)
+    cache = None if args.no_cache else BuildCache(args.cache_dir)
+    AssetWatcher(jobs, cache, args.debounce, args.interval, args.quiet).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,426 @@
 import pandas as pd
+import numpy as np
+import io
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from json_stream import JsonStreamWriter, RecordCollector, TeeWriter
+from json_lines import JsonLinesWriter
+from asset_compress import print_size_report, write_compressed_companions
+from kv_shards import KvShardWriter
+from search_index import SearchIndexWriter, index_path_for
+from asset_patches import PatchWriter, log_patch
+from id_map import IdMap, SequentialIds
+from instrumentation import EventBuffer, Metrics
+from readers import WorkbookReader
+
+
+def iter_rows_iterrows(df, df_loaded, tag_col_names, metrics, other_values=None):
+    """
+    Original row-by-row classification loop, kept for comparison with the vectorized engine
+    
+    Args:
+        df (DataFrame): Data columns, with NaN already replaced by None
+        df_loaded (DataFrame): Every loaded column of the sheet (data and tag columns), with NaN
+            replaced by None, used for tag detection
+        tag_col_names (list): Names of the tag columns in df_loaded
+        metrics (Metrics): Counts "skipped_rows", "header_rows" and "end_markers"
+        other_values (array): Values of each row in the columns of the sheet that were not
+            loaded, None when df_loaded holds every column
+    
+    Yields:
+        tuple: (row index, row dictionary with Tag_i fields added)
+    """
+    # Initialize tag tracking
+    current_tags = {}  # Dictionary to store multiple tags
+    
+    for index, row in df.iterrows():
+        # Get the corresponding row with the tag columns for tag detection
+        full_row = df_loaded.iloc[index]
+        
+        # Convert row data to dictionary (only data columns)
+        row_dict = row.to_dict()
+        
+        # Track if this is a header row
+        is_header_row = False
+        
+        # Check each tag column for header rows
+        for i, tag_col_name in enumerate(tag_col_names):
+            # Get the value in the tag column
+            tag_column_value = full_row.get(tag_col_name)
+            
+            # Check if this is a "header" row (tag column filled, others mostly empty)
+            if tag_column_value is not None:
+                # Count non-null values outside tag columns
+                non_tag_values = sum(1 for k, v in full_row.items() 
+                                    if k not in tag_col_names and v is not None)
+                if other_values is not None:
+                    non_tag_values += other_values[index]
+                
+                # If there are no (or very few) non-tag values, it's a header row
+                if non_tag_values <= 1:  # Allow at most 1 non-tag column to have a value
+                    # This is a header/tag row, update the current tag for this column
+                    
+                    # Check if this is an "END" marker
+                    if is_end_marker(tag_column_value):
+                        # If "END" marker is found, clear the tag for this column
+                        if i in current_tags:
+                            del current_tags[i]
+                        metrics.count("end_markers")
+                    else:
+                        # Regular tag
+                        current_tags[i] = tag_column_value
+                    
+                    is_header_row = True
+        
+        # Skip this row if it's a header row
+        if is_header_row:
+            metrics.count("header_rows")
+            continue
+        
+        # Check if all fields in data part are null
+        all_null = all(v is None for v in row_dict.values())
+        
+        # Skip row if all fields are null
+        if all_null:
+            metrics.count("skipped_rows")
+            continue
+        
+        # Add current tags if available
+        for i, tag_value in current_tags.items():
+            if i < len(tag_col_names):  # Safety check
+                # Use Tag_i format for multiple tags, or just Tag for single tag
+                if len(tag_col_names) == 1:
+                    row_dict["Tag_0"] = tag_value
+                else:
+                    row_dict[f"Tag_{i}"] = tag_value
+        
+        yield index, row_dict
+
+
+def iter_rows_vectorized(df, df_loaded, tag_col_names, metrics, other_values=None):
+    """
+    Columnar version of iter_rows_iterrows that classifies all rows with whole-frame operations
+    
+    Non-null counts, header rows and END markers are computed as boolean masks over the sheet.
+    Only the header rows are replayed in Python to carry the tags forward, so the output
+    (including Tag_i key order after an END marker) matches the row-by-row loop exactly.
+    
+    Args:
+        df (DataFrame): Data columns, with NaN already replaced by None
+        df_loaded (DataFrame): Every loaded column of the sheet (data and tag columns), with NaN
+            replaced by None, used for tag detection
+        tag_col_names (list): Names of the tag columns in df_loaded
+        metrics (Metrics): Counts "skipped_rows", "header_rows" and "end_markers"
+        other_values (array): Values of each row in the columns of the sheet that were not
+            loaded, None when df_loaded holds every column
+    
+    Yields:
+        tuple: (row index, row dictionary with Tag_i fields added)
+    """
+    num_rows = len(df)
+    
+    # Same dtype interleaving as iterrows, so values serialize identically
+    data_values = df.to_numpy()
+    full_values = df_loaded.to_numpy()
+    
+    # The row loop tests "v is not None", so NaN left in float columns counts as a value
+    data_present = data_values.astype(object) != None  # noqa: E711
+    full_present = full_values.astype(object) != None  # noqa: E711
+    
+    # Rows with at most one non-null value outside the tag columns can be header rows
+    non_tag_mask = ~df_loaded.columns.isin(tag_col_names)
+    non_tag_counts = full_present[:, non_tag_mask].sum(axis=1)
+    if other_values is not None:
+        non_tag_counts = non_tag_counts + other_values
+    header_candidates = non_tag_counts <= 1
+    
+    # Collect tag events (row, tag index, value) from every tag column
+    header_rows = np.zeros(num_rows, dtype=bool)
+    events = []
+    full_columns = list(df_loaded.columns)
+    for i, tag_col_name in enumerate(tag_col_names):
+        col_idx = full_columns.index(tag_col_name)
+        event_rows = np.flatnonzero(full_present[:, col_idx] & header_candidates)
+        header_rows[event_rows] = True
+        events.extend((row, i, full_values[row, col_idx]) for row in event_rows.tolist())
+    events.sort(key=lambda event: (event[0], event[1]))
+    
+    # Replay the header rows to get the tags in effect after each of them
+    current_tags = {}
+    snapshot_rows = []
+    snapshots = []
+    for row, i, tag_value in events:
+        if is_end_marker(tag_value):
+            current_tags.pop(i, None)
+            metrics.count("end_markers")
+        else:
+            current_tags[i] = tag_value
+        
+        tags = [(f"Tag_{i}", value) for i, value in current_tags.items()]
+        if snapshot_rows and snapshot_rows[-1] == row:
+            snapshots[-1] = tags
+        else:
+            snapshot_rows.append(row)
+            snapshots.append(tags)
+    
+    # Data rows are neither header rows nor completely empty
+    has_data = data_present.any(axis=1)
+    metrics.count("header_rows", int(np.count_nonzero(header_rows)))
+    metrics.count("skipped_rows", int(np.count_nonzero(~header_rows & ~has_data)))
+    data_rows = np.flatnonzero(~header_rows & has_data)
+    
+    # Carry the tags forward: each data row uses the last header row above it
+    snapshot_idx = np.searchsorted(snapshot_rows, data_rows, side="right") - 1
+    snapshots.append([])  # Index -1 means no header row yet
+    
+    columns = df.columns.tolist()
+    rows = data_values.tolist()
+    for row, tag_idx in zip(data_rows.tolist(), snapshot_idx.tolist()):
+        row_dict = dict(zip(columns, rows[row]))
+        row_dict.update(snapshots[tag_idx])
+        yield df.index[row], row_dict
+
+
+def is_end_marker(value):
+    """Check whether a tag cell is an "END" marker that clears the current tag"""
+    return isinstance(value, str) and value.strip().upper() == "END"
+
+
+# Row classification engines selectable through excel_to_json(engine=...)
+ROW_ENGINES = {
+    "vectorized": iter_rows_vectorized,
+    "iterrows": iter_rows_iterrows,
+}
+
+# Layouts of the non-consolidated output, selectable through excel_to_json(row_format=...)
+#   files  one '{prefix}_{sheet}_row{n}.json' file per row
+#   jsonl  one '{prefix}_{sheet}.jsonl' file per sheet, with an offset index to read records by id
+ROW_FORMATS = ("files", "jsonl")
+
+
+def iter_sheet_records(excel, sheet_name, header_row=0, id_field="id", columns=None, tag_column=None,
+                       engine="vectorized", start_id=0, metrics=None, ids=None):
+    """
+    Convert one worksheet, yielding its records one at a time
+    
+    Args:
+        excel (WorkbookReader or str): Open workbook or path to the Excel file
+        sheet_name (str): Sheet to convert
+        header_row, id_field, columns, tag_column, engine, start_id: As for excel_to_json
+        metrics (Metrics): Receives timers, counters and progress messages
+        ids (SequentialIds or StableIds): Assigns the record ids, defaults to sequential ids from start_id
+    
+    Yields:
+        tuple: (row index, record dictionary with Tag_i and ID fields)
+    """
+    row_engine = ROW_ENGINES[engine]
+    if metrics is None:
+        metrics = Metrics()
+    if ids is None:
+        ids = SequentialIds(start_id)
+    
+    metrics.log(f"Processing sheet: {sheet_name}")
+    
+    # Helper function to check if a value is an Excel column letter
+    def is_excel_column(col):
+        return isinstance(col, str) and len(col) <= 3 and col.upper()[0] in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    
+    # Helper function to convert Excel column letter to 0-based index
+    def excel_col_to_index(col):
+        col_idx = 0
+        for i, char in enumerate(reversed(col.upper())):
+            col_idx += (ord(char) - ord('A') + 1) * (26 ** i)
+        return col_idx - 1  # Convert to 0-based index
+    
+    tag_cols = []
+    if tag_column:
+        tag_cols = [tag_column] if not isinstance(tag_column, (list, tuple, set)) else list(tag_column)
+        tag_cols = [col for col in tag_cols if col is not None]
+    
+    # Convert Excel column letters to indices for both columns and tag_column
+    data_col_indices = None
+    tag_col_indices = None
+    if columns is not None and all(is_excel_column(col) for col in columns):
+        data_col_indices = [excel_col_to_index(col) for col in columns]
+    if all(is_excel_column(col) for col in tag_cols):
+        tag_col_indices = [excel_col_to_index(col) for col in tag_cols]
+    
+    # Read worksheet data with specified header row. When every column is given as a letter
+    # only the data and tag columns are loaded, otherwise the names are needed to pick them.
+    # Tag rows are told apart by every value of the row, so the reader also counts the values
+    # of each row in the columns it skips
+    workbook = excel if isinstance(excel, WorkbookReader) else WorkbookReader(excel, warn=metrics.warn)
+    try:
+        with metrics.phase("load"):
+            if data_col_indices and tag_col_indices is not None:
+                df_loaded, sheet_cols, other_values = workbook.read_columns(
+                    sheet_name, data_col_indices + tag_col_indices, header=header_row,
+                    count_others=bool(tag_col_indices))
+            else:
+                df_loaded = workbook.read_frame(sheet_name, header=header_row)
+                sheet_cols = list(range(len(df_loaded.columns)))
+                other_values = None
+    finally:
+        if workbook is not excel:
+            workbook.close()
+    metrics.log(f"Loaded columns: {df_loaded.columns.tolist()}")
+    
+    # Ensure DataFrame is not empty
+    if df_loaded.empty:
+        metrics.log(f"  Sheet '{sheet_name}' is empty, skipping")
+        return
+    
+    resolve_start = time.perf_counter()
+    
+    # Convert NaN values to None (null in JSON)
+    df_loaded = df_loaded.where(pd.notnull(df_loaded), None)
+    df = df_loaded
+    
+    # Position of each sheet column in the loaded DataFrame
+    loaded_positions = {col: i for i, col in enumerate(sheet_cols)}
+    
+    # Process content columns
+    if columns is not None:
+        # Check if columns are Excel column letters
+        if data_col_indices is not None:
+            # Create a new DataFrame with only the specified columns
+            if data_col_indices:
+                # Select columns that exist in the sheet
+                valid_indices = [loaded_positions[idx] for idx in data_col_indices if idx in loaded_positions]
+                if valid_indices:
+                    df = df.iloc[:, valid_indices]
+                else:
+                    metrics.warn(f"Warning: No valid column indices found in {data_col_indices}")
+        else:
+            # Try to use column names
+            try:
+                df = df[columns]
+            except KeyError:
+                metrics.warn(f"Warning: Some columns {columns} not found in sheet '{sheet_name}'")
+                metrics.warn(f"Available columns: {', '.join(map(str, df.columns))}")
+                # Use only the columns that exist
+                existing_columns = [col for col in columns if col in df.columns]
+                if existing_columns:
+                    df = df[existing_columns]
+                else:
+                    metrics.warn(f"No valid columns found, using all columns")
+    
+    # Process tag columns
+    tag_col_names = []
+    if tag_cols:
+        # Check if tag columns are Excel column letters
+        if tag_col_indices is not None:
+            # Get the column names from the loaded DataFrame
+            for idx in tag_col_indices:
+                if idx in loaded_positions:
+                    tag_col_names.append(df_loaded.columns[loaded_positions[idx]])
+                else:
+                    metrics.warn(f"Warning: Tag column index {idx} is out of bounds")
+        else:
+            # Assume tag_column contains actual column names
+            for col in tag_cols:
+                if col in df_loaded.columns:
+                    tag_col_names.append(col)
+                else:
+                    metrics.warn(f"Warning: Tag column '{col}' not found, skipping")
+    
+    metrics.log(f"Data columns: {df.columns.tolist()}")
+    metrics.log(f"Tag columns: {tag_col_names}")
+    
+    # Remove columns that contain only null values from data columns
+    cols_to_drop = []
+    for col in df.columns:
+        if df[col].isna().all():
+            metrics.log(f"Skipping column {col}")
+            cols_to_drop.append(col)
+    
+    if cols_to_drop:
+        df = df.drop(columns=cols_to_drop)
+    
+    metrics.add_time("resolve", time.perf_counter() - resolve_start)
+    metrics.count("skipped_columns", len(cols_to_drop))
+    
+    # Process data for the sheet
+    counters_before = dict(metrics.counters)
+    record_count = 0
+    
+    # The engines classify the whole sheet before yielding the first row
+    rows = metrics.iter_phases(row_engine(df, df_loaded, tag_col_names, metrics, other_values), "classify",
+                               "extract")
+    for index, row_dict in rows:
+        # Add ID field
+        row_dict[id_field] = ids.assign(row_dict)
+        record_count += 1
+        yield index, row_dict
+    
+    metrics.count("records", record_count)
+    if ids.duplicates:
+        metrics.count("duplicate_keys", ids.duplicates)
+        metrics.warn(f"  Warning: {ids.duplicates} records share their key with an earlier record of the sheet")
+    
+    # Per-row events are only counted, summarize them once per sheet
+    sheet_counts = {name: metrics.counters.get(name, 0) - counters_before.get(name, 0)
+                    for name in ("end_markers", "skipped_rows")}
+    if sheet_counts["end_markers"] > 0:
+        metrics.log(f"  Found {sheet_counts['end_markers']} END markers")
+    if sheet_counts["skipped_rows"] > 0:
+        metrics.log(f"  Skipped {sheet_counts['skipped_rows']} rows where all content fields were null")
+
+
+def _worker_source(excel):
+    """What a worker process opens the workbook from: its path or content, None for other file objects"""
+    if excel.path is not None:
+        return str(excel.excel_file)
+    if isinstance(excel.excel_file, io.BytesIO):
+        return excel.excel_file.getvalue()
+    return None
+
+
+def _convert_sheet(source, reader, sheet_name, options):
+    """
+    Convert one worksheet in a worker process of excel_to_json
+    
+    Returns:
+        tuple: (list of (row index, record) pairs, the worker's metrics.as_dict(), its events)
+    """
+    events = EventBuffer()
+    metrics = Metrics(sink=events, echo=False)
+    with metrics.phase("load"):
+        excel = WorkbookReader(source, reader, warn=metrics.warn)
+    with excel:
+        records = list(iter_sheet_records(excel, sheet_name, metrics=metrics, **options))
+    return records, metrics.as_dict(), events.records
+
+
+def _worker_records(future, metrics, id_field, ids):
+    """Records of a sheet converted by _convert_sheet, passing on its metrics and assigning stable ids"""
+    records, snapshot, events = future.result()
+    metrics.merge(snapshot, events)
+    if ids is not None:
+        # The worker numbered the records, the id map only exists in this process
+        for _, row_dict in records:
+            row_dict[id_field] = ids.assign(row_dict)
+        if ids.duplicates:
+            metrics.count("duplicate_keys", ids.duplicates)
+            metrics.warn(f"  Warning: {ids.duplicates} records share their key with an earlier record of the sheet")
+    return records
+
 
 def excel_to_json(excel_file, output_dir=None, prefix=None, sheets=None, header_row=0, id_field="id", 
-                 columns=None, consolidated=True, tag_column=None):
+                 columns=None, consolidated=True, tag_column=None, engine="vectorized",
+                 output_filename=None, sheet_keys=None, start_id=0, minify=False, compress=False,
+                 shard_dir=None, search_index=False, patch_dir=None, id_map=None, key_fields=None,
+                 reader="auto", row_format="files", write_json=True, sinks=None, metrics=None,
+                 max_workers=1):
     """
     Read worksheets from an Excel file and generate JSON output
     
     Args:
-        excel_file (str): Path to the Excel file
+        excel_file (str, bytes, file or WorkbookReader): Path to the Excel file, its content, or a
+            workbook that is already open. An open workbook is left open, so several conversions can share it
         output_dir (str): Output directory, defaults to 'output' folder in current directory
         prefix (str): Output filename prefix, defaults to Excel filename
         sheets (list): List of sheet names to process, defaults to all sheets
@@ -17,22 +429,67 @@ def excel_to_json(excel_file, output_dir=None, prefix=None, sheets=None, header_
         columns (list): List of columns to include in the JSON output, defaults to all columns
         consolidated (bool): Generate a single consolidated JSON file instead of individual files per row
         tag_column (list or str): Column(s) to use for tag detection. If empty list, no tags will be added
+        engine (str): Row classification engine, "vectorized" (default) or "iterrows" for the original loop
+        output_filename (str): Consolidated output filename, defaults to '{prefix}_consolidated.json'
+        sheet_keys (dict): Maps sheet names to the keys used in the consolidated JSON, defaults to the sheet names
+        start_id (int): First ID assigned in each sheet, defaults to 0
+        minify (bool): Write minified JSON instead of pretty-printing it with indent=2
+        compress (bool): Also write .gz and .br companions of the consolidated file and print their sizes
+        shard_dir (str): Also write each sheet as pre-chunked Deno KV values into '{shard_dir}/{kv key}/'.
+            The KV key of a consolidated file with one sheet is its file stem, the key migrateJsonToKV.jsx
+            uploads it under, otherwise the sheet key
+        search_index (bool): Also write a search index of the records, '{output stem}.index.json'
+        patch_dir (str): Also compare the records with the previous run and write the changes as a
+            versioned patch into '{patch_dir}/{output stem}/'
+        id_map (str): Id map file. When set, ids stay the same across runs for records with the same
+            key instead of following the row position, see id_map.IdMap
+        key_fields (list): Fields identifying a record in the id map, e.g. ["原名", "Tag_0"]. Required
+            with id_map
+        reader (str): Workbook reader backend, "auto" (default), "calamine", "openpyxl" or "pandas".
+            Falls back to the next available backend when the requested one is not installed
+        row_format (str): Output without consolidated, "files" (default) for one JSON file per row or
+            "jsonl" for one JSON Lines file per sheet, see json_lines.JsonLinesWriter
+        write_json (bool): Write the JSON file(s). False leaves the records to the sinks and the
+            other outputs
+        sinks (list): More StreamWriters that receive every record,
+            e.g. a RecordCollector. Each sheet is one array, named by its sheet key
+        metrics (Metrics): Receives timers, counters and progress messages, defaults to printing them
+        max_workers (int): Worker processes converting the sheets, None for the CPU count. Each worker
+            loads its sheets from the workbook file or content, the records are written here in sheet
+            order, so the output is the same as with the default of 1. Timers add up the time of all
+            workers. Workbooks given as other file objects are converted in this process
+    
+    Returns:
+        list: Paths of the JSON files written, empty when none of the sheets exist or write_json is False
     """
+    if engine not in ROW_ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of: {', '.join(ROW_ENGINES)}")
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"Unknown row format '{row_format}', expected one of: {', '.join(ROW_FORMATS)}")
+    if metrics is None:
+        metrics = Metrics()
+    
     # Create output directory
     if output_dir is None:
         output_dir = Path('output')
     else:
         output_dir = Path(output_dir)
     
-    output_dir.mkdir(exist_ok=True)
+    if write_json or search_index:
+        output_dir.mkdir(exist_ok=True)
+    
+    # Open the workbook with the selected reader backend, unless it is already open
+    owns_excel = not isinstance(excel_file, WorkbookReader)
+    if owns_excel:
+        with metrics.phase("load"):
+            excel = WorkbookReader(excel_file, reader, warn=metrics.warn)
+    else:
+        excel = excel_file
+    all_sheet_names = excel.sheet_names
     
     # Set filename prefix
     if prefix is None:
-        prefix = Path(excel_file).stem
-    
-    # Read all worksheets from Excel file
-    excel = pd.ExcelFile(excel_file)
-    all_sheet_names = excel.sheet_names
+        prefix = excel.name
     
     # Determine which sheets to process
     if sheets is None:
@@ -40,221 +497,186 @@ def excel_to_json(excel_file, output_dir=None, prefix=None, sheets=None, header_
     else:
         sheet_names = [s for s in sheets if s in all_sheet_names]
         if not sheet_names:
-            print(f"Warning: None of the specified sheets {sheets} were found in the Excel file.")
-            print(f"Available sheets: {', '.join(all_sheet_names)}")
-            return
+            metrics.warn(f"Warning: None of the specified sheets {sheets} were found in the Excel file.")
+            metrics.warn(f"Available sheets: {', '.join(all_sheet_names)}")
+            if owns_excel:
+                excel.close()
+            return []
     
-    print(f"Found {len(sheet_names)} sheets to process: {', '.join(sheet_names)}")
+    metrics.log(f"Found {len(sheet_names)} sheets to process: {', '.join(sheet_names)}")
     
-    # Dictionary to store all data if using consolidated mode
-    consolidated_data = {}
-    file_counter = 0
+    # Outputs that receive the records, fed through one TeeWriter
+    file_name = output_filename or f"{prefix}_consolidated.json"
+    file_path = output_dir / file_name
+    writers = []
     
-    # Process each worksheet
-    for sheet_name in sheet_names:
-        print(f"Processing sheet: {sheet_name}")
-        
-        # Read worksheet data with specified header row
-        df = pd.read_excel(excel, sheet_name=sheet_name, header=header_row)
-        print(f"Original columns: {df.columns.tolist()}")
-        
-        # Ensure DataFrame is not empty
-        if df.empty:
-            print(f"  Sheet '{sheet_name}' is empty, skipping")
-            continue
-        
-        # Make a copy of the full DataFrame for tag detection
-        df_full = df.copy()
-        
-        # Convert Excel column letters to indices for both columns and tag_column
-        data_col_indices = []
-        tag_col_indices = []
-        
-        # Helper function to check if a value is an Excel column letter
-        def is_excel_column(col):
-            return isinstance(col, str) and len(col) <= 3 and col.upper()[0] in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-        
-        # Helper function to convert Excel column letter to 0-based index
-        def excel_col_to_index(col):
-            col_idx = 0
-            for i, char in enumerate(reversed(col.upper())):
-                col_idx += (ord(char) - ord('A') + 1) * (26 ** i)
-            return col_idx - 1  # Convert to 0-based index
-        
-        # Process content columns
-        if columns is not None:
-            # Check if columns are Excel column letters
-            if all(is_excel_column(col) for col in columns):
-                for col in columns:
-                    data_col_indices.append(excel_col_to_index(col))
-                
-                # Create a new DataFrame with only the specified columns
-                if data_col_indices:
-                    # Select columns that exist in the DataFrame
-                    valid_indices = [idx for idx in data_col_indices if idx < len(df.columns)]
-                    if valid_indices:
-                        df = df.iloc[:, valid_indices]
-                    else:
-                        print(f"Warning: No valid column indices found in {data_col_indices}")
+    # In consolidated mode every sheet is streamed into a single JSON file
+    writer = None
+    if consolidated and write_json:
+        writer = JsonStreamWriter(file_path, indent=None if minify else 2)
+        writers.append(writer)
+    
+    # Or every sheet into a JSON Lines file, instead of a file per row
+    lines_writer = None
+    if not consolidated and write_json and row_format == "jsonl":
+        lines_writer = JsonLinesWriter(output_dir, prefix, id_field=id_field)
+        writers.append(lines_writer)
+    
+    # Optionally split every sheet into KV-sized chunks as the records stream past
+    shard_writer = None
+    if shard_dir is not None:
+        kv_keys = None
+        if consolidated and len(sheet_names) == 1:
+            sheet_key = sheet_keys.get(sheet_names[0], sheet_names[0]) if sheet_keys else sheet_names[0]
+            kv_keys = {sheet_key: file_path.stem}
+        shard_writer = KvShardWriter(shard_dir, kv_keys, warn=metrics.warn)
+        writers.append(shard_writer)
+    
+    # Optionally index the records for the frontend search
+    index_writer = None
+    if search_index:
+        index_file = index_path_for(file_path) if consolidated else output_dir / f"{prefix}.index.json"
+        index_writer = SearchIndexWriter(index_file, id_field=id_field)
+        writers.append(index_writer)
+    
+    writers.extend(sinks or [])
+    
+    # Keep ids stable across runs when an id map is given
+    stable_ids = None
+    if id_map is not None:
+        stable_ids = IdMap(id_map, key_fields, id_field=id_field, start_id=start_id)
+    
+    # Optionally diff the records against the previous run, recorded once everything else is complete
+    patch_writer = None
+    if patch_dir is not None:
+        patch_writer = PatchWriter(patch_dir, file_path.stem if consolidated else prefix, id_field=id_field,
+                                   warn=metrics.warn)
+        writers.append(patch_writer)
+    row_files = []
+    
+    # Optionally convert the sheets in worker processes, all of them are submitted up front
+    pool = None
+    futures = {}
+    source = _worker_source(excel) if max_workers != 1 and len(sheet_names) > 1 else None
+    if source is not None:
+        sheet_options = {"header_row": header_row, "id_field": id_field, "columns": columns,
+                         "tag_column": tag_column, "engine": engine, "start_id": start_id}
+        pool = ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(sheet_names)))
+        futures = {sheet_name: pool.submit(_convert_sheet, source, excel.reader, sheet_name, sheet_options)
+                   for sheet_name in sheet_names}
+    
+    outputs = TeeWriter(writers)
+    outputs.open()
+    try:
+        # Process each worksheet
+        for sheet_name in sheet_names:
+            sheet_key = sheet_keys.get(sheet_name, sheet_name) if sheet_keys else sheet_name
+            ids = stable_ids.array(sheet_key) if stable_ids is not None else None
+            if pool is not None:
+                records = _worker_records(futures[sheet_name], metrics, id_field, ids)
             else:
-                # Try to use column names
-                try:
-                    df = df[columns]
-                except KeyError:
-                    print(f"Warning: Some columns {columns} not found in sheet '{sheet_name}'")
-                    print(f"Available columns: {', '.join(map(str, df.columns))}")
-                    # Use only the columns that exist
-                    existing_columns = [col for col in columns if col in df.columns]
-                    if existing_columns:
-                        df = df[existing_columns]
-                    else:
-                        print(f"No valid columns found, using all columns")
-        
-        # Process tag columns
-        tag_col_names = []
-        if tag_column:
-            tag_cols = [tag_column] if not isinstance(tag_column, (list, tuple, set)) else list(tag_column)
+                records = iter_sheet_records(excel, sheet_name, header_row, id_field, columns, tag_column,
+                                             engine, start_id, metrics, ids)
             
-            # Check if tag columns are Excel column letters
-            if all(is_excel_column(col) for col in tag_cols if col is not None):
-                for col in tag_cols:
-                    if col is None:
-                        continue
-                    tag_idx = excel_col_to_index(col)
-                    tag_col_indices.append(tag_idx)
+            sheet_started = False
+            for index, row_dict in records:
+                serialize_start = time.perf_counter()
                 
-                # Get the column names from the original DataFrame
-                for idx in tag_col_indices:
-                    if idx < len(df_full.columns):
-                        tag_col_names.append(df_full.columns[idx])
-                    else:
-                        print(f"Warning: Tag column index {idx} is out of bounds")
-            else:
-                # Assume tag_column contains actual column names
-                for col in tag_cols:
-                    if col in df_full.columns:
-                        tag_col_names.append(col)
-                    else:
-                        print(f"Warning: Tag column '{col}' not found, skipping")
-        
-        print(f"Data columns: {df.columns.tolist()}")
-        print(f"Tag columns: {tag_col_names}")
-        
-        # Convert NaN values to None (null in JSON)
-        df = df.where(pd.notnull(df), None)
-        df_full = df_full.where(pd.notnull(df_full), None)
-        
-        # Remove columns that contain only null values from data columns
-        cols_to_drop = []
-        for col in df.columns:
-            if df[col].isna().all():
-                print(f"Skipping column {col}")
-                cols_to_drop.append(col)
-        
-        if cols_to_drop:
-            df = df.drop(columns=cols_to_drop)
-        
-        # Process data for the sheet
-        sheet_data = []
-        skipped_rows = 0
-        sequential_id = 0  # Initialize sequential ID counter
-        
-        # Initialize tag tracking
-        current_tags = {}  # Dictionary to store multiple tags
-        
-        for index, row in df.iterrows():
-            # Get the corresponding row from the full DataFrame for tag detection
-            full_row = df_full.iloc[index]
-            
-            # Convert row data to dictionary (only data columns)
-            row_dict = row.to_dict()
-            
-            # Track if this is a header row
-            is_header_row = False
-            
-            # Check each tag column for header rows
-            for i, tag_col_name in enumerate(tag_col_names):
-                # Get the value in the tag column
-                tag_column_value = full_row.get(tag_col_name)
+                # Only add the sheet once it has a non-empty row
+                if not sheet_started:
+                    outputs.begin_array(sheet_key)
+                    sheet_started = True
+                outputs.write_item(row_dict)
                 
-                # Check if this is a "header" row (tag column filled, others mostly empty)
-                if tag_column_value is not None:
-                    # Count non-null values outside tag columns
-                    non_tag_values = sum(1 for k, v in full_row.items() 
-                                        if k not in tag_col_names and v is not None)
+                if not consolidated and write_json and lines_writer is None:
+                    # Create filename including sheet name
+                    file_name = f"{prefix}_{sheet_name}_row{index+1}.json"
+                    row_file_path = output_dir / file_name
                     
-                    # If there are no (or very few) non-tag values, it's a header row
-                    if non_tag_values <= 1:  # Allow at most 1 non-tag column to have a value
-                        # This is a header/tag row, update the current tag for this column
-                        
-                        # Check if this is an "END" marker
-                        if isinstance(tag_column_value, str) and tag_column_value.strip().upper() == "END":
-                            # If "END" marker is found, clear the tag for this column
-                            if i in current_tags:
-                                del current_tags[i]
-                            print(f"  Found END marker at row {index+1}, clearing tag for column {tag_col_name}")
+                    # Write JSON file
+                    with open(row_file_path, 'w', encoding='utf-8') as f:
+                        if minify:
+                            json.dump(row_dict, f, ensure_ascii=False, separators=(',', ':'))
                         else:
-                            # Regular tag
-                            current_tags[i] = tag_column_value
-                        
-                        is_header_row = True
-            
-            # Skip this row if it's a header row
-            if is_header_row:
-                continue
-            
-            # Check if all fields in data part are null
-            all_null = all(v is None for v in row_dict.values())
-            
-            # Skip row if all fields are null
-            if all_null:
-                skipped_rows += 1
-                continue
-            
-            # Add current tags if available
-            for i, tag_value in current_tags.items():
-                if i < len(tag_col_names):  # Safety check
-                    # Use Tag_i format for multiple tags, or just Tag for single tag
-                    if len(tag_col_names) == 1:
-                        row_dict["Tag_0"] = tag_value
-                    else:
-                        row_dict[f"Tag_{i}"] = tag_value
-            
-            # Add sequential ID field
-            row_dict[id_field] = sequential_id
-            sequential_id += 1  # Increment ID for next valid row
-            
-            if consolidated:
-                sheet_data.append(row_dict)
-            else:
-                # Create filename including sheet name
-                file_name = f"{prefix}_{sheet_name}_row{index+1}.json"
-                file_path = output_dir / file_name
-                
-                # Write JSON file
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(row_dict, f, ensure_ascii=False, indent=2)
+                            json.dump(row_dict, f, ensure_ascii=False, indent=2)
+                    
+                    row_files.append(row_file_path)
                 
-                file_counter += 1
-        
-        if skipped_rows > 0:
-            print(f"  Skipped {skipped_rows} rows where all content fields were null")
-            
-        if consolidated and sheet_data:  # Only add the sheet if it has non-empty rows
-            consolidated_data[sheet_name] = sheet_data
-            file_counter = 1
-    
-    # Write consolidated JSON file
-    if consolidated:
-        file_name = f"{prefix}_consolidated.json"
-        file_path = output_dir / file_name
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(consolidated_data, f, ensure_ascii=False, indent=2)
+                metrics.add_time("serialize", time.perf_counter() - serialize_start)
+    except BaseException:
+        outputs.abort()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if owns_excel:
+            excel.close()
+    
+    serialize_start = time.perf_counter()
+    for output in writers:
+        if output is not patch_writer:
+            output.close()
+    if shard_writer is not None:
+        # Lets the migration tell the shards are cut from the current asset file
+        if writer is not None:
+            shard_writer.record_source(file_path)
+        for shard_path in shard_writer.written:
+            metrics.log(f"Wrote KV shards to {shard_path}")
+    if index_writer is not None:
+        metrics.log(f"Wrote search index to {index_file}")
+        if compress:
+            write_compressed_companions(index_file, metrics.warn)
+    
+    written = row_files
+    if writer is not None:
+        written = [file_path]
+        metrics.log(f"Complete! Generated consolidated JSON file with {writer.arrays} sheets, saved as {file_path}")
         
-        print(f"Complete! Generated consolidated JSON file with {len(consolidated_data)} sheets, saved as {file_path}")
-    else:
-        print(f"Complete! Generated {file_counter} JSON files, saved in {output_dir.absolute()} directory")
+        if compress:
+            write_compressed_companions(file_path, metrics.warn)
+        if (minify or compress) and not metrics.quiet:
+            print_size_report([file_path])
+    elif lines_writer is not None:
+        written = lines_writer.written
+        metrics.log(f"Complete! Generated {len(lines_writer.written)} JSON Lines files, saved in {output_dir.absolute()} directory")
+    elif write_json:
+        metrics.log(f"Complete! Generated {len(row_files)} JSON files, saved in {output_dir.absolute()} directory")
+    
+    # The id map and patch are only recorded once the output itself is complete
+    if stable_ids is not None:
+        stable_ids.save()
+        metrics.log(f"Saved id map to {id_map}")
+    if patch_writer is not None:
+        patch_writer.close()
+        log_patch(patch_writer, metrics)
+    metrics.add_time("serialize", time.perf_counter() - serialize_start)
+    workbook_name = str(excel.excel_file) if excel.path is not None else excel.name
+    metrics.report("excel_to_json", excel_file=workbook_name, sheets=sheet_names, reader=excel.reader)
+    return written
+
+
+def table_records(excel_file, sheets=None, **options):
+    """
+    Convert worksheets and return their records instead of writing them to a file
+    
+    Takes the arguments of excel_to_json. Other outputs such as shard_dir or search_index are
+    still written, from the same pass over the sheets.
+    
+    Args:
+        excel_file (str, bytes, file or WorkbookReader): Path to the Excel file, its content, or an open workbook
+        sheets (list): List of sheet names to process, defaults to all sheets
+    
+    Returns:
+        dict: Maps each sheet key to its list of records, sheets without records are left out
+    
+    Example:
+        with open("PJS翻译资料.xlsx", "rb") as f:
+            terms = table_records(f.read(), ["25用专业名词表"], header_row=1, columns=["A", "B", "C"])
+    """
+    collector = RecordCollector()
+    sinks = [collector] + list(options.pop("sinks", None) or [])
+    excel_to_json(excel_file, sheets=sheets, write_json=False, sinks=sinks, **options)
+    return collector.data
 
 
 def main():
@@ -272,6 +694,9 @@ def main():
     # - For multiple tags: tag_column = ["D", "E"] 
     tag_column = ["D"]
     
+    # Row classification engine: "vectorized", or "iterrows" to compare with the original loop
+    engine = "vectorized"
+    
     # Execute conversion with consolidated option set to True
     excel_to_json(
         excel_file, 
@@ -282,7 +707,8 @@ def main():
         id_field,
         columns,
         consolidated=True,  # Generate a single consolidated JSON file
-        tag_column=tag_column  # Columns to use for tag detection
+        tag_column=tag_column,  # Columns to use for tag detection
+        engine=engine
     )
 
 if __name__ == "__main__":